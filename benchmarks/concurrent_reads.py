@@ -0,0 +1,71 @@
+"""Read throughput of a `ConcurrentTree` for a growing number of reader threads.
+
+Every reader resolves random paths with `get_by_path` for a fixed time, optionally while a writer
+keeps inserting into its own subtree. Run with `PYTHONPATH=source python benchmarks/concurrent_reads.py`.
+"""
+import argparse
+import random
+import threading
+import time
+
+from sapling import ConcurrentTree
+
+
+def build(fan_out, depth):
+    paths = ['root']
+    for _ in xrange(depth):
+        paths = ['{}/n{}'.format(path, i) for path in paths for i in xrange(fan_out)]
+    return ConcurrentTree.create_from_paths(paths), paths
+
+
+def run(tree, paths, readers, duration, with_writer):
+    stop = threading.Event()
+    counts = [0] * readers
+
+    def read(slot):
+        rnd = random.Random(slot)
+        count = 0
+        while not stop.is_set():
+            for _ in xrange(100):
+                tree.get_by_path(rnd.choice(paths))
+            count += 100
+        counts[slot] = count
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            tree.insert('root/writer/w{}'.format(i), force=True)
+            i += 1
+
+    threads = [threading.Thread(target=read, args=(slot,)) for slot in xrange(readers)]
+    if with_writer:
+        threads.append(threading.Thread(target=write))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fan-out', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=2.0)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--writer', action='store_true', help='insert continuously while reading')
+    args = parser.parse_args()
+
+    tree, paths = build(args.fan_out, args.depth)
+    print 'tree of {} nodes, writer {}'.format(len(tree.subtree()), 'on' if args.writer else 'off')
+    single = None
+    for readers in args.threads:
+        throughput = run(tree, paths, readers, args.duration, args.writer)
+        single = single or throughput
+        print '{:>3} readers: {:>10.0f} lookups/s ({:.2f}x)'.format(readers, throughput, throughput / single)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""Benchmarks of the Tree and Node hot paths over synthetic tree shapes.
+
+Every (shape, size, operation) case runs in its own process, which reports the best time over a
+few repeats and the peak resident memory of the process before and after the operation. Results
+are saved as JSON and can be compared with a previous run:
+
+    PYTHONPATH=source python benchmarks/suite.py --sizes 1000 100000 --save baseline.json
+    PYTHONPATH=source python benchmarks/suite.py --sizes 1000 100000 --compare baseline.json
+
+Shapes: `chain` (a single path), `wide` (every node a child of the root), `balanced` (fan-out of
+10), `paths` (file system like paths) and `corpus` (the first SIZE lines of the `--corpus` file,
+one path per line).
+"""
+import argparse
+import json
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import sapling
+import sapling.node
+from sapling import Tree, printTree, traverse_method
+
+
+def peak_memory_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+# shapes, as the paths of their leaves
+def chain(size):
+    return ['/'.join(['r'] + ['n{}'.format(i) for i in xrange(1, size)])]
+
+
+def wide(size):
+    return ['r/n{}'.format(i) for i in xrange(1, size)]
+
+
+def balanced(size, fan_out=10):
+    paths = []
+    level = ['r']
+    count = 1
+    while count < size:
+        next_level = []
+        for path in level:
+            for i in xrange(fan_out):
+                if count == size:
+                    break
+                next_level.append('{}/n{}'.format(path, i))
+                count += 1
+        level = next_level
+        paths.extend(level)
+    return sorted(paths)
+
+
+def file_paths(size, seed=0):
+    rnd = random.Random(seed)
+    words = ['src', 'lib', 'test', 'docs', 'build', 'core', 'util', 'data', 'io', 'net', 'api', 'ui']
+    nodes = set()
+    paths = []
+    while len(nodes) < size - 1:
+        segments = ['r']
+        for depth in xrange(rnd.randint(1, 8)):
+            segments.append('{}{}'.format(rnd.choice(words), rnd.randint(0, 20)))
+            nodes.add('/'.join(segments))
+            if len(nodes) >= size - 1:
+                break
+        paths.append('/'.join(segments))
+    return sorted(paths)
+
+
+def corpus(size, filename):
+    paths = []
+    with open(filename) as f:
+        for line in f:
+            line = line.strip().strip('/')
+            if line:
+                paths.append('r/' + line)
+            if len(paths) >= size:
+                break
+    return sorted(paths)
+
+
+SHAPES = {'chain': chain, 'wide': wide, 'balanced': balanced, 'paths': file_paths}
+
+
+def to_dict(node):
+    # the `create_from_dict` input of the subtree of `node`
+    def children(n):
+        return [c.name if not c.children else {c.name: children(c)} for c in n.children]
+
+    return {node.name: dict((c.name, children(c) if c.children else None) for c in node.children)}
+
+
+# operations: setup(paths) returns a callable, which is timed
+def op_create_from_paths(paths):
+    return lambda: Tree.create_from_paths(paths)
+
+
+def op_insert(paths):
+    def run():
+        t = Tree('r')
+        for path in paths:
+            t.insert(path, force=True)
+    return run
+
+
+def op_create_from_dict(paths):
+    dct = to_dict(Tree.create_from_paths(paths))
+    return lambda: Tree.create_from_dict(dct)
+
+
+def _tree_and_sample(paths, count):
+    t = Tree.create_from_paths(paths)
+    nodes = list(t)
+    rnd = random.Random(0)
+    return t, [rnd.choice(nodes) for _ in xrange(count)]
+
+
+def op_get_by_path(paths):
+    t, sample = _tree_and_sample(paths, 1000)
+    queries = [n.path for n in sample]
+
+    def run():
+        for path in queries:
+            t.get_by_path(path)
+    return run
+
+
+def op_get_all(paths):
+    t, sample = _tree_and_sample(paths, 10)
+    names = [n.name for n in sample]
+
+    def run():
+        for name in names:
+            list(t.get_all(name))
+    return run
+
+
+def op_traverse_dfs(paths):
+    t = Tree.create_from_paths(paths)
+    return lambda: sum(1 for _ in t.traverse(method=traverse_method.dfs))
+
+
+def op_traverse_bfs(paths):
+    t = Tree.create_from_paths(paths)
+    return lambda: sum(1 for _ in t.traverse(method=traverse_method.bfs))
+
+
+def op_path(paths):
+    t = Tree.create_from_paths(paths)
+    nodes = list(t)
+
+    def run():
+        # all cached paths are stale after a new generation
+        sapling.node._generation += 1
+        for n in nodes:
+            n.path
+    return run
+
+
+def op_leaves(paths):
+    t = Tree.create_from_paths(paths)
+    return lambda: t.leaves
+
+
+def op_printTree(paths):
+    t = Tree.create_from_paths(paths)
+    return lambda: printTree(t)
+
+
+OPERATIONS = dict((name[3:], f) for name, f in globals().items() if name.startswith('op_'))
+
+
+def run_case(shape, size, operation, repeats, corpus_file=None):
+    paths = corpus(size, corpus_file) if shape == 'corpus' else SHAPES[shape](size)
+    result = {'shape': shape, 'size': size, 'operation': operation}
+    try:
+        run = OPERATIONS[operation](paths)
+        result['setup_peak_kb'] = peak_memory_kb()
+        timings = []
+        for _ in xrange(repeats):
+            start = time.time()
+            run()
+            timings.append(time.time() - start)
+        result['seconds'] = min(timings)
+        result['peak_kb'] = peak_memory_kb()
+    except (RuntimeError, MemoryError) as e:
+        # e.g. the recursion of `create_from_dict` on deep chains
+        result['error'] = '{}: {}'.format(type(e).__name__, e)
+    return result
+
+
+def run_isolated(shape, size, operation, repeats, corpus_file=None):
+    command = [sys.executable, __file__, '--case', shape, str(size), operation, '--repeats', str(repeats)]
+    if corpus_file:
+        command += ['--corpus', corpus_file]
+    return json.loads(subprocess.check_output(command))
+
+
+def compare(results, baseline, tolerance):
+    previous = dict(((r['shape'], r['size'], r['operation']), r) for r in baseline['results'])
+    regressions = 0
+    for r in results:
+        old = previous.get((r['shape'], r['size'], r['operation']))
+        if old is None or 'seconds' not in old or 'seconds' not in r:
+            continue
+        ratio = r['seconds'] / old['seconds'] if old['seconds'] else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = 'REGRESSION'
+            regressions += 1
+        print '{shape:>8} {size:>9} {operation:>18} {ratio:6.2f}x {flag}'.format(ratio=ratio, flag=flag, **r)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shapes', nargs='+', default=['chain', 'wide', 'balanced', 'paths'],
+                        choices=sorted(SHAPES) + ['corpus'])
+    parser.add_argument('--sizes', nargs='+', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--operations', nargs='+', default=sorted(OPERATIONS), choices=sorted(OPERATIONS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--corpus', help='file with one path per line, for the corpus shape')
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare with')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='slowdown ratio reported as a regression')
+    parser.add_argument('--case', nargs=3, metavar=('SHAPE', 'SIZE', 'OPERATION'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        shape, size, operation = args.case
+        print json.dumps(run_case(shape, int(size), operation, args.repeats, args.corpus))
+        return
+
+    results = []
+    for shape in args.shapes:
+        for size in args.sizes:
+            for operation in args.operations:
+                result = run_isolated(shape, size, operation, args.repeats, args.corpus)
+                results.append(result)
+                if 'error' in result:
+                    print '{shape:>8} {size:>9} {operation:>18} {error}'.format(**result)
+                else:
+                    print '{shape:>8} {size:>9} {operation:>18} {seconds:10.4f}s {peak_kb:>9}kB'.format(**result)
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'sapling': getattr(sapling, '__version__', None),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
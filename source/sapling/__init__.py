@@ -1,2 +1,7 @@
-from node import Node, traverse_method
-from tree import Tree, printTree
+from node import CompactNode, Node, TreeListener, WeakNode, gc_paused, traverse_method
+from tree import LazyTree, Tree, iterTree, printTree
+from flat import FlatTree
+from locking import ConcurrentTree, RWLock
+from lazy import LazyNode, Loader
+from journal import ChangeFeed, Journal
+from radix import RadixTree
@@ -0,0 +1,96 @@
+import operator
+
+from sapling.node import TreeListener, traverse_method
+
+
+def _data(node):
+    return node.data
+
+
+def _one(node):
+    return 1
+
+
+# name -> (combine, value, inverse)
+PRESETS = {
+    'size': (operator.add, _one, operator.neg),
+    'sum': (operator.add, _data, operator.neg),
+    'min': (min, _data, None),
+    'max': (max, _data, None),
+}
+
+
+class Aggregate(TreeListener):
+    """Value of every subtree of a tree, folded with an associative `combine`, kept up to date.
+
+    The aggregate of a node is `combine(value(node), aggregate(child), ...)` over its children. When
+    a change happens, only the changed node and its ancestors are updated: by applying the change as
+    a delta if `inverse` (returning the inverse element, the combine being then a commutative group
+    operation like addition) is given, otherwise by folding again each ancestor's children.
+    """
+
+    def __init__(self, tree, combine, value=None, inverse=None):
+        self.tree = tree
+        self.combine = combine
+        self.value = value or _data
+        self.inverse = inverse
+
+        self.values = {}
+        self._compute_subtree(tree)
+
+    def __getitem__(self, node):
+        return self.values[node]
+
+    def _fold(self, node):
+        combine = self.combine
+        values = self.values
+        result = self.value(node)
+        for child in node.children:
+            result = combine(result, values[child])
+        return result
+
+    def _compute_subtree(self, node):
+        values = self.values
+        for n in node.traverse(method=traverse_method.dfs_post):
+            values[n] = self._fold(n)
+
+    def _propagate(self, node, delta):
+        # `node` and its ancestors changed by `delta` (when invertible)
+        values = self.values
+        while node is not None:
+            if self.inverse is not None:
+                values[node] = self.combine(values[node], delta)
+            else:
+                values[node] = self._fold(node)
+            node = node.parent
+
+    def attached(self, node):
+        self._compute_subtree(node)
+        self._propagate(node.parent, self.values[node])
+
+    def detached(self, node, parent):
+        values = self.values
+        removed = values[node]
+        for n in node.traverse():
+            del values[n]
+        self._propagate(parent, self.inverse(removed) if self.inverse is not None else None)
+
+    def moved(self, node, old_parent):
+        # the values of the subtree are unchanged, only the ancestors on both sides are
+        moved = self.values[node]
+        if self.inverse is not None:
+            self._propagate(old_parent, self.inverse(moved))
+            self._propagate(node.parent, moved)
+        else:
+            self._propagate(old_parent, None)
+            self._propagate(node.parent, None)
+
+    def data_changed(self, node, old_data):
+        values = self.values
+        old, values[node] = values[node], self._fold(node)
+        if self.inverse is not None:
+            self._propagate(node.parent, self.combine(values[node], self.inverse(old)))
+        else:
+            self._propagate(node.parent, None)
+
+    renamed = data_changed
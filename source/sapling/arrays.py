@@ -0,0 +1,104 @@
+import numbers
+from collections import namedtuple
+
+from sapling.node import gc_paused, iter_parents
+
+# rows are the nodes in depth-first pre-order, the row number being the pre-order index;
+# `parent` is -1 for the first row and `data` is None unless all data is numeric
+TreeArrays = namedtuple('TreeArrays', 'nodes names parent depth size data')
+
+
+def _require_numpy():
+    # imported on first use, loading numpy takes much longer than importing sapling
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('numpy is required for array operations')
+    return numpy
+
+
+def to_arrays(node):
+    """Return the `TreeArrays` of the subtree of `node`."""
+    numpy = _require_numpy()
+    nodes = []
+    parents = []
+    depths = []
+    for depth, parent, n in iter_parents(node):
+        parents.append(parent)
+        nodes.append(n)
+        depths.append(depth)
+
+    parent = numpy.array(parents, dtype=numpy.intp)
+    depth = numpy.array(depths, dtype=numpy.intp)
+    size = numpy.ones(len(nodes), dtype=numpy.intp)
+    # deepest level first, each one adding its sizes to the level above
+    rows = numpy.argsort(depth, kind='mergesort')
+    bounds = numpy.searchsorted(depth[rows], numpy.arange(depth.max() + 2))
+    for d in xrange(len(bounds) - 2, 0, -1):
+        level = rows[bounds[d]:bounds[d + 1]]
+        numpy.add.at(size, parent[level], size[level])
+
+    data = [n.data for n in nodes]
+    if all(isinstance(d, numbers.Number) for d in data):
+        data = numpy.array(data)
+    else:
+        data = None
+
+    return TreeArrays(nodes, [n.name for n in nodes], parent, depth, size, data)
+
+
+def from_arrays(names, parent, tree_cls, data=None):
+    """Build a `tree_cls` from node names and parent rows, every parent row preceding its children."""
+    numpy = _require_numpy()
+    names = list(names)
+    parent = numpy.asarray(parent).tolist()
+    if data is None:
+        data = [None] * len(names)
+    else:
+        data = data.tolist() if isinstance(data, numpy.ndarray) else list(data)
+    if len(parent) != len(names) or len(data) != len(names):
+        raise ValueError('names, parent and data must have the same length')
+    if not names or parent[0] >= 0:
+        raise ValueError('the first row must be the root')
+
+    tree = tree_cls(names[0], data[0])
+    # the constructors replace falsy data (0 included) by the name
+    if data[0] is not None:
+        tree._data = data[0]
+    node_cls = tree._node_cls
+    nodes = [tree]
+    with gc_paused():
+        for i in xrange(1, len(names)):
+            p = parent[i]
+            if not 0 <= p < i:
+                raise ValueError('the parent of row {} does not precede it'.format(i))
+            node = node_cls(names[i], data[i])
+            if data[i] is not None:
+                node._data = data[i]
+            node._link(nodes[p])
+            nodes.append(node)
+    return tree
+
+
+def subtree_sums(arrays, values=None):
+    """Sum of `values` (the data by default) over the subtree of every row, from prefix sums."""
+    numpy = _require_numpy()
+    values = arrays.data if values is None else numpy.asarray(values)
+    if values is None:
+        raise ValueError('the tree data is not numeric')
+    # subtrees are contiguous in pre-order
+    prefix = numpy.concatenate(([0], numpy.cumsum(values)))
+    rows = numpy.arange(len(arrays.size))
+    return prefix[rows + arrays.size] - prefix[rows]
+
+
+def depth_histogram(arrays):
+    """Number of nodes at every depth."""
+    numpy = _require_numpy()
+    return numpy.bincount(arrays.depth)
+
+
+def leaf_mask(arrays):
+    """Boolean mask of the rows which are leaves."""
+    numpy = _require_numpy()
+    return arrays.size == 1
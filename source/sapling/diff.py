@@ -0,0 +1,174 @@
+from collections import namedtuple
+
+from sapling.node import traverse_method
+
+# paths are `ranked_path`s, `subtree` is a (name, data, children) tuple, children being such tuples too
+Insert = namedtuple('Insert', 'path subtree')
+Remove = namedtuple('Remove', 'path')
+Move = namedtuple('Move', 'source target')
+DataChange = namedtuple('DataChange', 'path old new')
+Rename = namedtuple('Rename', 'path name')
+
+
+def _rank(node):
+    # position of `node` among the children of its parent with the same name
+    parent = node.parent
+    if parent is None:
+        return 0
+    entry = parent._children_by_name.get(node.name)
+    if not isinstance(entry, list):
+        return 0
+    for rank, child in enumerate(entry):
+        if child is node:
+            return rank
+
+
+def ranked_path(node):
+    """Path of `node` telling same-named siblings apart.
+
+    The segment of the n-th (from 0) child named `name` is `name[n]`, the rank being omitted for the
+    first one unless the name itself ends with ']'.
+    """
+    sep = node._PATH_SEP
+    segments = []
+    while node is not None:
+        name = node.name
+        rank = _rank(node)
+        segments.append('{}[{}]'.format(name, rank) if rank or name.endswith(']') else name)
+        node = node.parent
+    segments.reverse()
+    return sep.join(segments)
+
+
+def _split_rank(segment):
+    if segment.endswith(']'):
+        start = segment.rfind('[')
+        if start >= 0 and segment[start + 1:-1].isdigit():
+            return segment[:start], int(segment[start + 1:-1])
+    return segment, 0
+
+
+def resolve(tree, path, ignored=None):
+    """Return the node at the `ranked_path` `path` of `tree`, or None.
+
+    Ranks are counted as if the node `ignored` was not in the tree.
+    """
+    segments = path.strip(tree._PATH_SEP).split(tree._PATH_SEP)
+    node = tree.root
+    if _split_rank(segments[0]) != (node.name, 0):
+        return None
+    for segment in segments[1:]:
+        name, rank = _split_rank(segment)
+        children = node.get_children(name)
+        if ignored is not None:
+            children = [child for child in children if child is not ignored]
+        if rank >= len(children):
+            return None
+        node = children[rank]
+    return node
+
+
+def _freeze(node):
+    frozen = {}
+    for n in node.traverse(method=traverse_method.dfs_post):
+        frozen[n] = (n.name, n.data, tuple(frozen.pop(child) for child in n.children))
+    return frozen[node]
+
+
+def diff(old, new):
+    """Return the operations turning the subtree of `old` into the subtree of `new`.
+
+    Children are matched by name (the n-th child of a name with the n-th child of the same name),
+    subtrees with equal structural hashes are skipped without being visited. Removed and inserted
+    subtrees with equal hashes become moves. Sibling order is not compared.
+    Removes and moves come last, by decreasing rank, so that applying them in order does not shift
+    the ranks of the paths of the next ones.
+    """
+    if old.name != new.name:
+        raise ValueError('cannot diff subtrees with different root names')
+
+    changes = []
+    removed = []
+    inserted = []
+
+    stack = [(old, new)]
+    while stack:
+        a, b = stack.pop()
+        if a.structural_hash == b.structural_hash:
+            continue
+        if a.data != b.data:
+            changes.append(DataChange(ranked_path(b), a.data, b.data))
+
+        matched = set()
+        seen = {}
+        for child in a.children:
+            rank = seen.get(child.name, 0)
+            seen[child.name] = rank + 1
+            candidates = b.get_children(child.name)
+            if rank < len(candidates):
+                matched.add(candidates[rank])
+                stack.append((child, candidates[rank]))
+            else:
+                removed.append(child)
+        inserted.extend(child for child in b.children if child not in matched)
+
+    # (rank, operation) of the moves and removes
+    detached = []
+    removed_by_hash = {}
+    for node in removed:
+        removed_by_hash.setdefault(node.structural_hash, []).append(node)
+    for node in inserted:
+        sources = removed_by_hash.get(node.structural_hash)
+        if sources:
+            source = sources.pop()
+            detached.append((_rank(source), Move(ranked_path(source), ranked_path(node))))
+        else:
+            changes.append(Insert(ranked_path(node), _freeze(node)))
+    detached.extend((_rank(node), Remove(ranked_path(node)))
+                    for nodes in removed_by_hash.itervalues() for node in nodes)
+    detached.sort(key=lambda item: -item[0])
+
+    return changes + [operation for _, operation in detached]
+
+
+def patch(tree, operations):
+    """Apply `operations` computed by `diff`, or recorded by a `sapling.journal.ChangeFeed`, to `tree`.
+
+    Operation paths are resolved with `resolve`. The target of a move is the path of the node after
+    the move, its parent is resolved without counting the moved node.
+    """
+    sep = tree._PATH_SEP
+
+    def get(path, ignored=None):
+        node = resolve(tree, path, ignored)
+        if node is None:
+            raise ValueError('no node at \'{}\''.format(path))
+        return node
+
+    for operation in operations:
+        if isinstance(operation, Move):
+            node = get(operation.source)
+            node.set_parent(get(operation.target.rsplit(sep, 1)[0], node))
+        elif isinstance(operation, Remove):
+            get(operation.path).unparent()
+        elif isinstance(operation, DataChange):
+            get(operation.path).data = operation.new
+        elif isinstance(operation, Rename):
+            get(operation.path).name = operation.name
+        elif isinstance(operation, Insert):
+            parent = get(operation.path.rsplit(sep, 1)[0])
+            name, data, children = operation.subtree
+            # data is assigned as is, the constructors would replace falsy data by the name
+            node = tree._node_cls(name)
+            node._data = data
+            stack = [(node, children)]
+            while stack:
+                n, children = stack.pop()
+                for name, data, grandchildren in children:
+                    child = tree._node_cls(name)
+                    child._data = data
+                    child._link(n)
+                    stack.append((child, grandchildren))
+            node.set_parent(parent)
+        else:
+            raise TypeError('unknown operation {!r}'.format(operation))
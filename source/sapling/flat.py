@@ -0,0 +1,347 @@
+from array import array
+from collections import deque
+from itertools import chain
+
+from sapling.node import traverse_method
+from sapling.tree import Tree, printTree
+
+
+class FlatNode(object):
+    """Lightweight view of a single node stored inside a `FlatTree`."""
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def name(self):
+        return self.tree._name_of(self.index)
+
+    @property
+    def data(self):
+        return self.tree._data.get(self.index, self.name)
+
+    @data.setter
+    def data(self, value):
+        self.tree._set_data(self.index, value)
+
+    @property
+    def parent(self):
+        parent = self.tree._parent[self.index]
+        return FlatNode(self.tree, parent) if parent >= 0 else None
+
+    @property
+    def children(self):
+        tree = self.tree
+        return [FlatNode(tree, i) for i in tree._iter_children(self.index)]
+
+    def get_child(self, name):
+        child = self.tree._find_child(self.index, name)
+        return FlatNode(self.tree, child) if child >= 0 else None
+
+    def traverse(self, method=traverse_method.dfs):
+        tree = self.tree
+        for i in tree._traverse(self.index, method):
+            yield FlatNode(tree, i)
+
+    @property
+    def root(self):
+        return FlatNode(self.tree, 0)
+
+    @property
+    def path(self):
+        return self.tree._path_of(self.index)
+
+    @property
+    def siblings(self):
+        parent = self.tree._parent[self.index]
+        if parent < 0:
+            return []
+        return [FlatNode(self.tree, i) for i in self.tree._iter_children(parent) if i != self.index]
+
+    @property
+    def leaves(self):
+        first_child = self.tree._first_child
+        return [FlatNode(self.tree, i) for i in self.tree._traverse(self.index) if first_child[i] < 0]
+
+    def __eq__(self, other):
+        return isinstance(other, FlatNode) and self.tree is other.tree and self.index == other.index
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+    def __str__(self):
+        return '<{} {}>'.format(type(self).__name__, self.name)
+
+
+class FlatTree(object):
+    """Tree stored in parallel arrays instead of one object per node.
+
+    Every node is an index into the `parent`, `first child`, `last child`, `next sibling` and
+    `name id` arrays, names are interned in a string table and only data differing from the node's
+    name is kept. Nodes are handed out as `FlatNode` views, created on demand.
+    """
+    _PATH_SEP = '/'
+    # children lists up to this size are searched, longer ones get a name index on first search
+    _SCAN_LIMIT = 32
+
+    def __init__(self, name, data=None):
+        self._names = []
+        self._name_ids = {}
+        self._data = {}
+        # parent index -> {name id: index of its first child with that name}, for long children lists
+        self._children_by_name = {}
+
+        self._name_id = array('i')
+        self._parent = array('i')
+        self._first_child = array('i')
+        self._last_child = array('i')
+        self._next_sibling = array('i')
+
+        self._add(name, -1, data)
+
+    @classmethod
+    def create_from_paths(cls, paths):
+        paths = iter(paths)
+        for first in paths:
+            break
+        else:
+            raise ValueError('No paths given')
+
+        tree = cls(first.rstrip(cls._PATH_SEP).split(cls._PATH_SEP)[0])
+        tree.insert_many(chain([first], paths))
+
+        return tree
+
+    @classmethod
+    def from_tree(cls, tree):
+        flat = cls(tree.name, tree.data)
+        stack = [(tree, 0)]
+        while stack:
+            node, index = stack.pop()
+            for child in node.children:
+                stack.append((child, flat._add(child.name, index, child.data)))
+        return flat
+
+    def to_tree(self, tree_cls=Tree):
+        """Rebuild a regular node based tree."""
+        tree = tree_cls(self._name_of(0), self._data.get(0))
+        node_cls = tree._node_cls
+        nodes = {0: tree}
+        for i in self._traverse(0):
+            if i:
+                node = nodes[i] = node_cls(self._name_of(i), self._data.get(i))
+                node._link(nodes[self._parent[i]])
+        return tree
+
+    # storage
+    def _add(self, name, parent, data=None):
+        index = len(self._parent)
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self._names)
+            self._names.append(name)
+
+        self._name_id.append(name_id)
+        self._parent.append(parent)
+        self._first_child.append(-1)
+        self._last_child.append(-1)
+        self._next_sibling.append(-1)
+        if data and data != name:
+            self._data[index] = data
+
+        if parent >= 0:
+            lookup = self._children_by_name.get(parent)
+            if lookup is not None:
+                lookup.setdefault(name_id, index)
+            last = self._last_child[parent]
+            if last < 0:
+                self._first_child[parent] = index
+            else:
+                self._next_sibling[last] = index
+            self._last_child[parent] = index
+        return index
+
+    def _set_data(self, index, data):
+        if data and data != self._name_of(index):
+            self._data[index] = data
+        else:
+            self._data.pop(index, None)
+
+    def _name_of(self, index):
+        return self._names[self._name_id[index]]
+
+    def _path_of(self, index):
+        name_ids = []
+        parent = self._parent
+        while index >= 0:
+            name_ids.append(self._name_id[index])
+            index = parent[index]
+        names = self._names
+        return self._PATH_SEP.join([names[i] for i in reversed(name_ids)])
+
+    def _iter_children(self, index):
+        next_sibling = self._next_sibling
+        child = self._first_child[index]
+        while child >= 0:
+            yield child
+            child = next_sibling[child]
+
+    def _find_child(self, index, name):
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            return -1
+        lookup = self._children_by_name.get(index)
+        if lookup is not None:
+            return lookup.get(name_id, -1)
+
+        name_ids = self._name_id
+        next_sibling = self._next_sibling
+        child = self._first_child[index]
+        scanned = 0
+        while child >= 0 and name_ids[child] != name_id:
+            child = next_sibling[child]
+            scanned += 1
+        if scanned > self._SCAN_LIMIT:
+            lookup = self._children_by_name[index] = {}
+            for i in self._iter_children(index):
+                lookup.setdefault(name_ids[i], i)
+        return child
+
+    def _traverse(self, start, method=traverse_method.dfs):
+        first_child = self._first_child
+        next_sibling = self._next_sibling
+
+        yield start
+        if method == traverse_method.bfs:  # Breadth-first search
+            queue = deque([start])
+            while queue:
+                child = first_child[queue.popleft()]
+                while child >= 0:
+                    yield child
+                    queue.append(child)
+                    child = next_sibling[child]
+        else:  # Depth-first search
+            parent = self._parent
+            node = first_child[start]
+            while node >= 0:
+                yield node
+                if first_child[node] >= 0:
+                    node = first_child[node]
+                    continue
+                while node != start and next_sibling[node] < 0:
+                    node = parent[node]
+                if node == start:
+                    break
+                node = next_sibling[node]
+
+    # TreeBase compatible interface
+    @property
+    def root(self):
+        return FlatNode(self, 0)
+
+    @property
+    def name(self):
+        return self._name_of(0)
+
+    @property
+    def path(self):
+        return self._name_of(0)
+
+    @property
+    def children(self):
+        return self.root.children
+
+    def traverse(self, method=traverse_method.dfs):
+        return self.root.traverse(method=method)
+
+    def __iter__(self):
+        return self.traverse()
+
+    def __len__(self):
+        return len(self._parent)
+
+    def get_by_path(self, path):
+        sep = self._PATH_SEP
+        nodes = path.strip(sep).split(sep)
+        if self._name_of(0) != nodes[0]:
+            return None
+
+        current_node = 0
+        for node in nodes[1:]:
+            current_node = self._find_child(current_node, node)
+            if current_node < 0:
+                return None
+        return FlatNode(self, current_node)
+
+    def insert(self, path, node=None, force=False):
+        """Same as `TreeBase.insert`, `node` (with its subtree) is copied into the tree."""
+        sep = self._PATH_SEP
+        node_names = path.rstrip(sep).split(sep)
+        if self._name_of(0) != node_names[0]:
+            return False
+
+        current_node = 0
+        for node_name in node_names[1:]:
+            child = self._find_child(current_node, node_name)
+            if child < 0:
+                if not force:
+                    return False
+                child = self._add(node_name, current_node)
+            current_node = child
+
+        if node is not None:
+            stack = [(node, self._add(node.name, current_node, node.data))]
+            while stack:
+                n, index = stack.pop()
+                for child in n.children:
+                    stack.append((child, self._add(child.name, index, child.data)))
+        return True
+
+    def insert_many(self, paths):
+        """Bulk insert, see `TreeBase.insert_many`."""
+        sep = self._PATH_SEP
+        root_name = self._name_of(0)
+
+        created = 0
+        stack = [0]
+        # name -> index of the children of the nodes in the stack, built on first use
+        lookups = [None]
+        previous = []
+        for path in paths:
+            node_names = path.rstrip(sep).split(sep)
+            if node_names[0] != root_name:
+                continue
+            node_names = node_names[1:]
+
+            common = 0
+            limit = min(len(node_names), len(previous))
+            while common < limit and node_names[common] == previous[common]:
+                common += 1
+            del stack[common + 1:]
+            del lookups[common + 1:]
+
+            current_node = stack[-1]
+            for node_name in node_names[common:]:
+                lookup = lookups[-1]
+                if lookup is None:
+                    lookup = lookups[-1] = {}
+                    for child in self._iter_children(current_node):
+                        lookup.setdefault(self._name_of(child), child)
+                child = lookup.get(node_name)
+                if child is None:
+                    child = lookup[node_name] = self._add(node_name, current_node)
+                    created += 1
+                stack.append(child)
+                lookups.append(None)
+                current_node = child
+            previous = node_names
+
+        return created
+
+    def printout(self, start_node=None, printer=printTree, **kwargs):
+        return printer(start_node or self.root, **kwargs)
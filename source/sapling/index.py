@@ -0,0 +1,190 @@
+from array import array
+
+from sapling.node import TreeListener, iter_parents, subtree_ends
+
+
+class NameIndex(TreeListener):
+    """Secondary index of tree nodes by name and, optionally, by data.
+
+    Kept current by the tree it is registered on.
+    """
+
+    def __init__(self, tree, data=False):
+        self.tree = tree
+        self.by_name = {}
+        self.by_data = {} if data else None
+
+        self.attached(tree)
+
+    def find(self, key, by_name=True):
+        """Return the set of nodes matching `key`, or None if the index cannot answer."""
+        if by_name:
+            return self.by_name.get(key, ())
+
+        if self.by_data is None:
+            return None
+        try:
+            return self.by_data.get(key, ())
+        except TypeError:
+            return None
+
+    @staticmethod
+    def _add(index, key, node):
+        try:
+            nodes = index.get(key)
+        except TypeError:
+            return
+        if nodes is None:
+            index[key] = nodes = set()
+        nodes.add(node)
+
+    @staticmethod
+    def _discard(index, key, node):
+        try:
+            nodes = index.get(key)
+        except TypeError:
+            return
+        if nodes is not None:
+            nodes.discard(node)
+            if not nodes:
+                del index[key]
+
+    def attached(self, node):
+        by_data = self.by_data
+        for n in node.traverse():
+            self._add(self.by_name, n.name, n)
+            if by_data is not None:
+                self._add(by_data, n.data, n)
+
+    def detached(self, node, parent):
+        by_data = self.by_data
+        for n in node.traverse():
+            self._discard(self.by_name, n.name, n)
+            if by_data is not None:
+                self._discard(by_data, n.data, n)
+
+    def moved(self, node, old_parent):
+        # names and data are unchanged
+        pass
+
+    def renamed(self, node, old_name):
+        self._discard(self.by_name, old_name, node)
+        self._add(self.by_name, node.name, node)
+
+    def data_changed(self, node, old_data):
+        if self.by_data is not None:
+            self._discard(self.by_data, old_data, node)
+            self._add(self.by_data, node.data, node)
+
+
+class _Intervals(object):
+    """Pre-order of the tree at one point, replaced as a whole so concurrent readers never mix two."""
+    __slots__ = ('order', 'positions', 'parents', 'ends', 'lifting')
+
+    def __init__(self, order, positions, parents, ends):
+        self.order = order
+        self.positions = positions
+        self.parents = parents
+        self.ends = ends
+        # binary lifting tables, built on the first lowest common ancestor query
+        self.lifting = None
+
+
+class IntervalIndex(TreeListener):
+    """Pre-order intervals of the tree nodes (nested sets).
+
+    Node `n` at pre-order position `p` owns the positions `p` to `end[p] - 1`: its subtree.
+    Ancestor checks and subtree sizes are O(1), subtrees are slices of the pre-order. The index
+    is rebuilt lazily on the first query after the tree structure changed. Lowest common ancestors
+    use binary lifting tables built on first use. A build is published with a single assignment,
+    so the readers of a `ConcurrentTree` may query (and rebuild) the index at the same time.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        # None when the tree structure changed since the last build
+        self._intervals = None
+
+    def attached(self, node):
+        self._intervals = None
+
+    def detached(self, node, parent):
+        self._intervals = None
+
+    def _current(self):
+        intervals = self._intervals
+        if intervals is None:
+            intervals = self._intervals = self._build()
+        return intervals
+
+    def _build(self):
+        order = []
+        positions = {}
+        parents = array('l')
+        for _, parent, node in iter_parents(self.tree):
+            positions[node] = len(order)
+            order.append(node)
+            parents.append(parent)
+        return _Intervals(order, positions, parents, subtree_ends(parents))
+
+    @staticmethod
+    def _position(intervals, node):
+        try:
+            return intervals.positions[node]
+        except KeyError:
+            raise ValueError('{} is not in the tree'.format(node))
+
+    @property
+    def order(self):
+        """Nodes of the tree in pre-order."""
+        return self._current().order
+
+    def position(self, node):
+        """Pre-order position of `node`."""
+        return self._position(self._current(), node)
+
+    def is_ancestor(self, ancestor, node):
+        intervals = self._current()
+        start = self._position(intervals, ancestor)
+        return start < self._position(intervals, node) < intervals.ends[start]
+
+    def subtree_size(self, node):
+        intervals = self._current()
+        start = self._position(intervals, node)
+        return intervals.ends[start] - start
+
+    def subtree(self, node):
+        """Nodes of the subtree of `node`, in pre-order."""
+        intervals = self._current()
+        start = self._position(intervals, node)
+        return intervals.order[start:intervals.ends[start]]
+
+    def lca(self, a, b):
+        """Lowest common ancestor of `a` and `b`."""
+        intervals = self._current()
+        a = self._position(intervals, a)
+        b = self._position(intervals, b)
+        ends = intervals.ends
+        if a <= b < ends[a]:
+            return intervals.order[a]
+        if b <= a < ends[b]:
+            return intervals.order[b]
+
+        lifting = intervals.lifting
+        if lifting is None:
+            lifting = intervals.lifting = self._build_lifting(intervals)
+        for up in reversed(lifting):
+            ancestor = up[a]
+            if ancestor >= 0 and not ancestor <= b < ends[ancestor]:
+                a = ancestor
+        return intervals.order[intervals.parents[a]]
+
+    @staticmethod
+    def _build_lifting(intervals):
+        # lifting[k][p] is the position of the 2**k-th ancestor of position p, -1 above the root
+        lifting = [intervals.parents]
+        count = len(intervals.order)
+        while (1 << len(lifting)) < count:
+            up = lifting[-1]
+            lifting.append(array('l', (up[up[p]] if up[p] >= 0 else -1 for p in xrange(count))))
+        return lifting
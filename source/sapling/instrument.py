@@ -0,0 +1,142 @@
+from collections import defaultdict
+from functools import wraps
+from itertools import chain
+from timeit import default_timer
+
+from sapling.node import NodeBase
+
+
+def _segments(tree, args, kwargs):
+    # path segments resolved by a call with a `path` argument
+    path = args[0] if args else kwargs['path']
+    return path.strip(tree._PATH_SEP).count(tree._PATH_SEP) + 1
+
+
+# operation name -> visited nodes of a call, from its (args, kwargs, result)
+_COUNTERS = {
+    'insert': lambda tree, args, kwargs, result: _segments(tree, args, kwargs),
+    'insert_many': lambda tree, args, kwargs, result: result,
+    'get_by_path': lambda tree, args, kwargs, result: _segments(tree, args, kwargs),
+}
+# operations returning iterators, their visited nodes are the yielded ones
+_ITERATORS = ('get_all', 'traverse')
+
+# trees with hooks, `NodeBase.set_parent` is probed while there are any
+_instrumented = [0]
+_set_parent = NodeBase.__dict__['set_parent']
+
+
+class Stats(object):
+    """Hook summing calls, visited nodes and seconds per operation."""
+
+    def __init__(self):
+        self.reset()
+
+    def __call__(self, operation, seconds, visited):
+        self.calls[operation] += 1
+        self.seconds[operation] += seconds
+        self.visited[operation] += visited
+
+    def reset(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.visited = defaultdict(int)
+
+    def as_dict(self):
+        return dict((operation, {'calls': self.calls[operation],
+                                 'seconds': self.seconds[operation],
+                                 'visited': self.visited[operation]}) for operation in self.calls)
+
+
+def _probe(tree, operation, method, counter):
+    hooks = tree._hooks
+
+    @wraps(method)
+    def probe(*args, **kwargs):
+        start = default_timer()
+        result = method(*args, **kwargs)
+        seconds = default_timer() - start
+        try:
+            visited = counter(tree, args, kwargs, result)
+        except Exception:
+            # the call succeeded, its report must not turn it into a failure
+            visited = 0
+        for hook in hooks:
+            hook(operation, seconds, visited)
+        return result
+    return probe
+
+
+def _probe_iterator(tree, operation, method):
+    hooks = tree._hooks
+
+    def iterate(iterator):
+        # only the time spent producing items is measured, not the consumer's
+        seconds = 0.0
+        visited = 0
+        try:
+            while True:
+                start = default_timer()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    seconds += default_timer() - start
+                    break
+                seconds += default_timer() - start
+                visited += 1
+                yield item
+        finally:
+            for hook in hooks:
+                hook(operation, seconds, visited)
+
+    @wraps(method)
+    def probe(*args, **kwargs):
+        return iterate(iter(method(*args, **kwargs)))
+    return probe
+
+
+def _probed_set_parent(self, other, force=False):
+    # the tree the node is attached to, or detached from
+    hooks = getattr((self if other is None else other).root, '_hooks', ())
+    start = default_timer()
+    _set_parent(self, other, force=force)
+    seconds = default_timer() - start
+    for hook in hooks:
+        hook('set_parent', seconds, 1)
+
+
+def instrument(tree, hook):
+    """Report the calls made on `tree` to `hook(operation, seconds, visited)`.
+
+    Operations are 'insert', 'insert_many', 'get_by_path', 'get_all', 'traverse' and 'set_parent'
+    (of any node of the tree). Visited nodes are the path segments resolved, the nodes created by
+    `insert_many` and the nodes yielded by iterators. Nested calls are reported too, `get_all`
+    walking the tree with `traverse` for instance. Trees without hooks are not slowed down, except
+    for `set_parent` while any tree has hooks.
+    """
+    if not tree._hooks:
+        tree._hooks = [hook]
+        for operation, counter in _COUNTERS.iteritems():
+            setattr(tree, operation, _probe(tree, operation, getattr(tree, operation), counter))
+        for operation in _ITERATORS:
+            setattr(tree, operation, _probe_iterator(tree, operation, getattr(tree, operation)))
+        _instrumented[0] += 1
+        if _instrumented[0] == 1:
+            NodeBase.set_parent = _probed_set_parent
+    elif hook not in tree._hooks:
+        tree._hooks.append(hook)
+
+
+def uninstrument(tree, hook):
+    """Stop reporting to `hook`, the probes are removed with the last hook of `tree`."""
+    hooks = tree._hooks
+    if hook not in hooks:
+        return
+    hooks.remove(hook)
+    if not hooks:
+        del tree._hooks
+        for operation in chain(_COUNTERS, _ITERATORS):
+            delattr(tree, operation)
+        _instrumented[0] -= 1
+        if not _instrumented[0]:
+            NodeBase.set_parent = _set_parent
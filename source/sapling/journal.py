@@ -0,0 +1,155 @@
+import json
+import os
+
+from sapling.diff import DataChange, Insert, Move, Remove, Rename, _freeze, ranked_path
+from sapling.node import TreeListener
+
+# operation name, as written in journals -> operation class
+OPERATIONS = dict((cls.__name__, cls) for cls in (Insert, Remove, Move, DataChange, Rename))
+
+
+class ChangeFeed(TreeListener):
+    """Turns the changes of a tree into `sapling.diff` operations, delivered to subscribers.
+
+    Operations are recorded as changes happen, with the paths of that time, so applying them in
+    order with `patch` to a copy of the tree replays the changes. Paths are `ranked_path`s, telling
+    same-named siblings apart. A subscriber with a `batch_size` is called with lists
+    of that many operations, the remaining ones being delivered by `flush`.
+    """
+
+    def __init__(self):
+        # [callback, batch_size, pending operations]
+        self._subscribers = []
+        # path of the node being detached, moved or renamed, from before the change
+        self._source = None
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self, callback, batch_size=1):
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+        self._subscribers.append([callback, batch_size, []])
+
+    def unsubscribe(self, callback):
+        """Stop delivering to `callback`, after giving it its pending operations."""
+        for subscriber in self._subscribers:
+            if subscriber[0] == callback:
+                self._deliver(subscriber)
+                self._subscribers.remove(subscriber)
+                return
+        raise ValueError('{!r} is not subscribed'.format(callback))
+
+    def flush(self):
+        for subscriber in self._subscribers:
+            self._deliver(subscriber)
+
+    @staticmethod
+    def _deliver(subscriber):
+        operations = subscriber[2]
+        if operations:
+            subscriber[2] = []
+            subscriber[0](operations)
+
+    def _emit(self, operation):
+        for subscriber in self._subscribers:
+            subscriber[2].append(operation)
+            if len(subscriber[2]) >= subscriber[1]:
+                self._deliver(subscriber)
+
+    def changing(self, node):
+        self._source = ranked_path(node)
+
+    def attached(self, node):
+        self._emit(Insert(ranked_path(node), _freeze(node)))
+
+    def detached(self, node, parent):
+        self._emit(Remove(self._source))
+
+    def moved(self, node, old_parent):
+        self._emit(Move(self._source, ranked_path(node)))
+
+    def renamed(self, node, old_name):
+        self._emit(Rename(self._source, node.name))
+
+    def data_changed(self, node, old_data):
+        self._emit(DataChange(ranked_path(node), old_data, node.data))
+
+
+class Journal(object):
+    """Append-only file of operations, one JSON object per line, numbered from 0.
+
+    A `ChangeFeed` subscriber, `tree.subscribe(Journal(path), batch_size=100)` for instance, each
+    batch being written at once. Names and data must be JSON serializable, strings are read back
+    UTF-8 encoded, as byte strings, and lists or tuples as lists.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sequence = 0
+        if os.path.exists(path):
+            complete = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith('\n'):
+                        break
+                    complete += len(line)
+                    self.sequence = json.loads(line)['seq'] + 1
+            # drop the line of an interrupted write, so the next entry starts on its own line
+            if complete != os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(complete)
+        self._file = open(path, 'a')
+
+    def __call__(self, operations):
+        lines = []
+        for operation in operations:
+            entry = operation._asdict()
+            entry['op'] = type(operation).__name__
+            entry['seq'] = self.sequence
+            self.sequence += 1
+            lines.append(json.dumps(entry) + '\n')
+        self._file.write(''.join(lines))
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def _to_bytes(value):
+    # JSON strings are decoded as unicode, while names and data are byte strings in most trees
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [_to_bytes(item) for item in value]
+    if isinstance(value, dict):
+        return dict((_to_bytes(key), _to_bytes(item)) for key, item in value.iteritems())
+    return value
+
+
+def read(path, start=0):
+    """Yield the `(sequence number, operation)` entries of a journal from `start` on.
+
+    A last line without its end of line, from an interrupted write, is ignored.
+    """
+    with open(path) as f:
+        for line in f:
+            if not line.endswith('\n'):
+                break
+            entry = json.loads(line)
+            sequence = entry.pop('seq')
+            if sequence >= start:
+                entry = _to_bytes(entry)
+                yield sequence, OPERATIONS[entry.pop('op')](**entry)
+
+
+def replay(tree, path, start=0):
+    """Apply the journal entries from `start` on to `tree`, return the sequence number to continue from.
+
+    A replica catches up by replaying again from the returned number. Operations are applied with
+    `tree.patch`, under the write lock of a `ConcurrentTree`.
+    """
+    for sequence, operation in read(path, start=start):
+        tree.patch([operation])
+        start = sequence + 1
+    return start
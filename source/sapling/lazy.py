@@ -0,0 +1,341 @@
+from collections import deque
+from itertools import izip
+
+from sapling.node import Node, traverse_method
+
+
+class Loader(object):
+    """Produces the children of lazy nodes, and unloads cold nodes past `max_loaded` loaded nodes.
+
+    `load(node)` returns the children of `node` as names, `(name, data)` or `(name, data, key)`
+    tuples (None data being the name), they are created as `node_cls` instances (the node class of the `LazyTree` by default)
+    sharing this loader.
+    Unloading picks nodes not accessed since the previous pass over the loaded nodes (the clock
+    approximation of least recently used), so `max_loaded` is exceeded until such nodes exist.
+    Nodes changed or with changed descendants are never unloaded, nor are nodes held by a running
+    traversal, whose queued or stacked children would be detached.
+    """
+
+    def __init__(self, load, max_loaded=None, node_cls=None, close=None):
+        self.load = load
+        self.max_loaded = max_loaded
+        self.node_cls = node_cls
+        self.loads = 0
+        # loaded nodes, oldest first
+        self._nodes = deque()
+        # releases what `load` reads from, a file for instance
+        self._close = close
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def close(self):
+        """Release the source of the nodes, unloaded nodes cannot be loaded anymore."""
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def _loaded(self, node):
+        self.loads += 1
+        self._nodes.append(node)
+        if self.max_loaded is not None and len(self._nodes) > self.max_loaded:
+            self._evict()
+
+    def _evict(self):
+        nodes = self._nodes
+        chances = len(nodes)
+        while len(nodes) > self.max_loaded and chances:
+            chances -= 1
+            node = nodes.popleft()
+            if not node._loaded or node._pinned:
+                continue
+            if node._referenced or node._holds:
+                node._referenced = False
+                nodes.append(node)
+            else:
+                node._unload()
+
+
+def _fetch(node):
+    return list(node._loader.load(node))
+
+
+def _hold(nodes, count=1):
+    # unloading an ancestor of a held node would unload it too, so the whole path is held
+    for node in nodes:
+        while node is not None:
+            node._holds += count
+            node = node.parent
+
+
+def _release(node, start):
+    # release a node of a depth-first stack held from `start`, only `start` holds its ancestors
+    if node is start:
+        _hold([node], -1)
+    else:
+        node._holds -= 1
+
+
+def _prefetch(pool, nodes):
+    # fetch in the pool, but build the children in the calling thread
+    unloaded = [node for node in nodes if not node._loaded]
+    if unloaded:
+        for node, items in izip(unloaded, pool.map(_fetch, unloaded)):
+            if not node._loaded:
+                node._load(items)
+
+
+class LazyNode(Node):
+    """Node whose children are loaded by its `Loader` on first access.
+
+    Everything reading children (traversals, `get_child`, `insert`, printing) loads them. Loading and
+    unloading are not mutations, they are not reported to listeners, so indexes and aggregates only
+    cover nodes loaded when they were built. Nodes held from an unloaded subtree become detached.
+    """
+
+    def __init__(self, name, data=None, loader=None, key=None):
+        # given by the loader to find the children of the node, a file offset for instance
+        self.key = key
+        self._loader = loader
+        self._loaded = loader is None
+        self._referenced = False
+        self._pinned = False
+        # running traversals needing the children of the node to stay loaded
+        self._holds = 0
+        super(LazyNode, self).__init__(name, data=data)
+
+    @property
+    def children(self):
+        if not self._loaded:
+            self._load()
+        self._referenced = True
+        return self._children
+
+    @children.setter
+    def children(self, value):
+        self._children = value
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def _load(self, items=None):
+        loader = self._loader
+        if items is None:
+            items = list(loader.load(self))
+        node_cls = loader.node_cls or type(self)
+
+        self._loaded = True
+        children = self._children
+        for item in items:
+            if isinstance(item, tuple):
+                name, data, key = item if len(item) == 3 else item + (None,)
+            else:
+                name, data, key = item, None, None
+            child = node_cls(name, loader=loader, key=key)
+            # None is the default data, other falsy data is kept unlike with the constructors
+            if data is not None:
+                child._data = data
+            child.parent = self
+            children.append(child)
+            self._index_child(child)
+
+        # loading is an access of the whole path, which must not be unloaded meanwhile
+        node = self
+        while node is not None:
+            node._referenced = True
+            node = node.parent
+        loader._loaded(self)
+
+    def traverse_concurrently(self, method=traverse_method.dfs, concurrency=8):
+        """Iterate like `traverse`, loading the children of sibling nodes `concurrency` at a time.
+
+        Every breadth-first level, or all the children of a node in depth-first orders, are loaded
+        together by a pool of threads before being visited, so `load` must be thread safe.
+        """
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(concurrency)
+        try:
+            _prefetch(pool, [self])
+            if method == traverse_method.bfs:
+                # a level stays held until the next one is loaded, unloading it would detach its children
+                level = [self]
+                _hold(level)
+                try:
+                    while level:
+                        for node in level:
+                            yield node
+                        next_level = [child for node in level for child in node.children]
+                        _hold(next_level)
+                        _prefetch(pool, next_level)
+                        _hold(level, -1)
+                        level = next_level
+                finally:
+                    _hold(level, -1)
+            elif method == traverse_method.dfs_post:
+                _prefetch(pool, self.children)
+                _hold([self])
+                stack = [(self, iter(self.children))]
+                try:
+                    while stack:
+                        for node in stack[-1][1]:
+                            if node.children:
+                                _prefetch(pool, node.children)
+                                node._holds += 1
+                                stack.append((node, iter(node.children)))
+                                break
+                            yield node
+                        else:
+                            node = stack.pop()[0]
+                            _release(node, self)
+                            yield node
+                finally:
+                    for node, _ in stack:
+                        _release(node, self)
+            else:
+                yield self
+                _prefetch(pool, self.children)
+                _hold([self])
+                stack = [(self, iter(self.children))]
+                try:
+                    while stack:
+                        for node in stack[-1][1]:
+                            yield node
+                            if node.children:
+                                _prefetch(pool, node.children)
+                                node._holds += 1
+                                stack.append((node, iter(node.children)))
+                                break
+                        else:
+                            _release(stack.pop()[0], self)
+                finally:
+                    for node, _ in stack:
+                        _release(node, self)
+        finally:
+            pool.terminate()
+
+    def _traverse_pre(self, with_depth, prune, max_depth):
+        # as `NodeBase._traverse_pre`, the nodes on the stack being held loaded
+        if prune is not None and prune(self):
+            return
+        yield (0, self) if with_depth else self
+        if max_depth is not None and max_depth < 1:
+            return
+
+        # the stack is a path, holding its nodes and the ancestors of the first holds the whole path
+        _hold([self])
+        stack = [(self, iter(self.children._storage()))]
+        try:
+            while stack:
+                for node in stack[-1][1]:
+                    if node is None or prune is not None and prune(node):
+                        continue
+
+                    depth = len(stack)
+                    yield (depth, node) if with_depth else node
+                    if node.children and (max_depth is None or depth < max_depth):
+                        node._holds += 1
+                        stack.append((node, iter(node.children._storage())))
+                        break
+                else:
+                    _release(stack.pop()[0], self)
+        finally:
+            for node, _ in stack:
+                _release(node, self)
+
+    def _traverse_post(self, with_depth, prune, max_depth):
+        # as `NodeBase._traverse_post`, the nodes on the stack being held loaded
+        if prune is not None and prune(self):
+            return
+
+        descend = max_depth is None or max_depth > 0
+        _hold([self])
+        stack = [(self, iter(self.children._storage() if descend else ()))]
+        try:
+            while stack:
+                for node in stack[-1][1]:
+                    if node is None or prune is not None and prune(node):
+                        continue
+
+                    if node.children and (max_depth is None or len(stack) < max_depth):
+                        node._holds += 1
+                        stack.append((node, iter(node.children._storage())))
+                        break
+                    yield (len(stack), node) if with_depth else node
+                else:
+                    node = stack.pop()[0]
+                    _release(node, self)
+                    yield (len(stack), node) if with_depth else node
+        finally:
+            for node, _ in stack:
+                _release(node, self)
+
+    def _traverse_bfs(self, with_depth, prune, max_depth):
+        # as `NodeBase._traverse_bfs`, the nodes whose children are queued being held loaded
+        if prune is not None and prune(self):
+            return
+        yield (0, self) if with_depth else self
+        if max_depth is not None and max_depth < 1:
+            return
+
+        _hold([self])
+        queue = deque([(1, self)])
+        try:
+            while queue:
+                depth, parent = queue[0]
+                descend = max_depth is None or depth < max_depth
+                for node in parent.children._storage():
+                    if node is None or prune is not None and prune(node):
+                        continue
+                    yield (depth, node) if with_depth else node
+                    if descend and node.children:
+                        _hold([node])
+                        queue.append((depth + 1, node))
+                queue.popleft()
+                _hold([parent], -1)
+        finally:
+            _hold([parent for _, parent in queue], -1)
+
+    def _unload(self):
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            for child in node._children:
+                child.parent = None
+                if child._loaded and child._loader is not None:
+                    child._loaded = False
+                    stack.append(child)
+            node._children = type(node._children)()
+            node._children_by_name = None
+        # the subtree is unchanged, its hash and snapshot stay valid
+        self._loaded = False
+        self._referenced = False
+
+    def get_child(self, name):
+        if not self._loaded:
+            self._load()
+        self._referenced = True
+        return super(LazyNode, self).get_child(name)
+
+    def get_children(self, name):
+        if not self._loaded:
+            self._load()
+        self._referenced = True
+        return super(LazyNode, self).get_children(name)
+
+    def _invalidate_cache(self):
+        # an unloaded node has no descendants with caches
+        if self._loaded:
+            super(LazyNode, self)._invalidate_cache()
+        else:
+            self._cache = None
+
+    def _invalidate_derived(self):
+        # reloaded children have no hash below a hashed parent, so the whole path is cleared
+        node = self
+        while node is not None:
+            node._hash = None
+            node._frozen = None
+            if not getattr(node, '_pinned', True):
+                node._pinned = True
+            node = node.parent
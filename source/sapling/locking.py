@@ -0,0 +1,177 @@
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from thread import get_ident
+
+from sapling.tree import Tree, printTree
+
+
+class RWLock(object):
+    """Reader-writer lock, many readers or a single writer, waiting writers go first.
+
+    Both locks are reentrant and the writer may take the read lock too. Taking the write lock while
+    holding only the read lock would deadlock, it raises a RuntimeError instead.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._waiting_writers = 0
+        self._writer = None
+        self._writes = 0
+        # per thread read depth, and whether the thread is counted in `_readers`
+        self._local = threading.local()
+
+    def acquire_read(self):
+        local = self._local
+        reads = getattr(local, 'reads', 0)
+        if reads or self._writer == get_ident():
+            local.reads = reads + 1
+            return
+
+        with self._condition:
+            while self._writer is not None or self._waiting_writers:
+                self._condition.wait()
+            self._readers += 1
+        local.reads = 1
+        local.shared = True
+
+    def release_read(self):
+        local = self._local
+        local.reads -= 1
+        if not local.reads and getattr(local, 'shared', False):
+            local.shared = False
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    def acquire_write(self):
+        me = get_ident()
+        if self._writer == me:
+            self._writes += 1
+            return
+        if getattr(self._local, 'reads', 0):
+            raise RuntimeError('cannot upgrade a read lock to a write lock')
+
+        with self._condition:
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writes = 1
+
+    def release_write(self):
+        self._writes -= 1
+        if not self._writes:
+            with self._condition:
+                self._writer = None
+                self._condition.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+def _reading(method):
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.read_locked():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def _writing(method):
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.write_locked():
+            return method(self, *args, **kwargs)
+    return locked
+
+
+def _materialized(method):
+    # generators would hold the lock until exhausted, lists are returned instead
+    @wraps(method)
+    def locked(self, *args, **kwargs):
+        with self.lock.read_locked():
+            return iter(list(method(self, *args, **kwargs)))
+    return locked
+
+
+class ConcurrentTree(Tree):
+    """Tree shared between threads, guarded by a single `RWLock`.
+
+    Queries run under the read lock, so any number of them run at the same time, and mutations of
+    the tree API under the write lock. `traverse` holds the read lock until the traversal is
+    exhausted or closed. Nodes changed directly (`set_parent`, `unparent`, `name`, `data`) must be
+    changed inside `write_locked()`, and nodes walked directly inside `read_locked()`.
+    """
+
+    def __init__(self, name, data=None, printer=printTree, node_cls=None):
+        self.lock = RWLock()
+        super(ConcurrentTree, self).__init__(name, data=data, printer=printer, node_cls=node_cls)
+
+    def read_locked(self):
+        return self.lock.read_locked()
+
+    def write_locked(self):
+        return self.lock.write_locked()
+
+    def traverse(self, *args, **kwargs):
+        iterator = super(ConcurrentTree, self).traverse(*args, **kwargs)
+        with self.lock.read_locked():
+            for item in iterator:
+                yield item
+
+    # queries
+    get_by_path = _reading(Tree.get_by_path)
+    get = _reading(Tree.get)
+    get_all = _materialized(Tree.get_all)
+    glob = _materialized(Tree.glob)
+    select = _reading(Tree.select)
+    __contains__ = _reading(Tree.__contains__)
+    __getitem__ = _reading(Tree.__getitem__)
+
+    is_ancestor = _reading(Tree.is_ancestor)
+    subtree_size = _reading(Tree.subtree_size)
+    subtree = _reading(Tree.subtree)
+    lca = _reading(Tree.lca)
+    aggregate = _reading(Tree.aggregate)
+
+    snapshot = _reading(Tree.snapshot)
+    diff = _reading(Tree.diff)
+    printout = _reading(Tree.printout)
+    save = _reading(Tree.save)
+    to_arrays = _reading(Tree.to_arrays)
+    parallel_map = _reading(Tree.parallel_map)
+    parallel_reduce = _reading(Tree.parallel_reduce)
+
+    # mutations
+    insert = _writing(Tree.insert)
+    insert_many = _writing(Tree.insert_many)
+    patch = _writing(Tree.patch)
+    replay = _writing(Tree.replay)
+
+    add_listener = _writing(Tree.add_listener)
+    remove_listener = _writing(Tree.remove_listener)
+    enable_index = _writing(Tree.enable_index)
+    disable_index = _writing(Tree.disable_index)
+    enable_interval_index = _writing(Tree.enable_interval_index)
+    disable_interval_index = _writing(Tree.disable_interval_index)
+    add_aggregate = _writing(Tree.add_aggregate)
+    remove_aggregate = _writing(Tree.remove_aggregate)
@@ -1,20 +1,294 @@
+import gc
+from array import array
 from collections import deque
+from contextlib import contextmanager
+from hashlib import sha1
+from itertools import islice
+from weakref import ref
+
+# bumped whenever a subtree moves or is renamed, cached root/depth/path of older generations are stale
+_generation = 0
+
+
+def _is_hashed(node):
+    return node._hash is not None
+
+
+@contextmanager
+def gc_paused():
+    """Pause the cyclic garbage collector, so building many nodes does not trigger full collections."""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def iter_parents(node):
+    """Yield `(depth, parent position, node)` for the subtree of `node` in pre-order.
+
+    Positions are pre-order indexes of the subtree, -1 being the parent position of `node`.
+    """
+    # position of the last node seen at each depth
+    positions = [-1]
+    position = 0
+    for depth, n in node._traverse_pre(True, None, None):
+        yield depth, positions[depth], n
+        if depth + 1 < len(positions):
+            positions[depth + 1] = position
+        else:
+            positions.append(position)
+        position += 1
+
+
+def subtree_ends(parents):
+    """Pre-order position following the subtree of every node, from the pre-order parent positions.
+
+    Subtrees are contiguous in pre-order, the subtree of `i` spans `i` to `ends[i] - 1`.
+    """
+    ends = array('l', xrange(1, len(parents) + 1))
+    for i in xrange(len(parents) - 1, 0, -1):
+        parent = parents[i]
+        if ends[i] > ends[parent]:
+            ends[parent] = ends[i]
+    return ends
 
 
 class traverse_method():
     dfs = 'depth-first search'
     bfs = 'breadth-first search'
+    dfs_post = 'post-order depth-first search'
+
+
+class TreeListener(object):
+    """Receives structural changes made anywhere below the tree it is registered on.
+
+    All callbacks run after the change has been applied, except `changing`.
+    """
+
+    def changing(self, node):
+        # `node` is about to be detached, moved or renamed
+        pass
+
+    def attached(self, node):
+        pass
+
+    def detached(self, node, parent):
+        pass
+
+    def renamed(self, node, old_name):
+        pass
+
+    def data_changed(self, node, old_data):
+        pass
+
+    def moved(self, node, old_parent):
+        # a node reparented within the tree, seen as a detach followed by an attach by default
+        self.detached(node, old_parent)
+        self.attached(node)
+
+
+class ChildList(object):
+    """Ordered children of a node, removing children by identity in O(1).
+
+    Removed children leave holes which reads skip over and which are squeezed out once they make
+    up half of the storage, so reading never modifies the list. Do not add or remove children
+    while iterating, iterate over `list(node.children)` instead.
+    """
+    __slots__ = ('_items', '_start', '_holes', '_positions')
+
+    # lists up to this size are searched instead of indexed
+    _SCAN_LIMIT = 32
+
+    def __init__(self, iterable=()):
+        self._items = []
+        # children before `_start` and `_holes` more after it are removed, their slots hold None
+        self._start = 0
+        self._holes = 0
+        # id(child) -> position in `_items`, built by the first removal from a long list
+        self._positions = None
+        for child in iterable:
+            self.append(child)
+
+    def __len__(self):
+        return len(self._items) - self._start - self._holes
+
+    def __iter__(self):
+        if self._holes:
+            return (child for child in islice(self._items, self._start, None) if child is not None)
+        if self._start:
+            return islice(self._items, self._start, None)
+        return iter(self._items)
+
+    def __reversed__(self):
+        if self._start or self._holes:
+            return (child for child in reversed(self._items) if child is not None)
+        return reversed(self._items)
 
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+
+        length = len(self)
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('child index out of range')
+        if self._holes:
+            return next(islice(self, index, None))
+        return self._items[self._start + index]
+
+    def __contains__(self, node):
+        try:
+            self._find(node)
+        except ValueError:
+            return False
+        return True
+
+    def __eq__(self, other):
+        if not isinstance(other, (ChildList, list, tuple)):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __getstate__(self):
+        return list(self)
+
+    def __setstate__(self, state):
+        self.__init__(state)
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, list(self))
+
+    def append(self, node):
+        if self._positions is not None:
+            self._positions[id(node)] = len(self._items)
+        self._items.append(node)
+
+    def extend(self, nodes):
+        for node in nodes:
+            self.append(node)
+
+    def index(self, node):
+        position = self._find(node)
+        if self._holes:
+            return sum(1 for child in islice(self._items, self._start, position) if child is not None)
+        return position - self._start
+
+    def remove(self, node):
+        """Remove `node`, compared by identity."""
+        position = self._find(node)
+        if self._positions is not None:
+            del self._positions[id(node)]
+
+        items = self._items
+        items[position] = None
+        if position == self._start:
+            self._start += 1
+            while self._holes and items[self._start] is None:
+                self._start += 1
+                self._holes -= 1
+        else:
+            self._holes += 1
+
+        # trailing holes are simply dropped
+        while len(items) > self._start and items[-1] is None:
+            items.pop()
+            self._holes -= 1
+        if self._start == len(items):
+            del items[:]
+            self._start = self._holes = 0
+        elif len(items) > self._SCAN_LIMIT and (self._start + self._holes) * 2 > len(items):
+            self._compact()
+
+    def _find(self, node):
+        items = self._items
+        positions = self._positions
+        if positions is None:
+            if len(items) - self._start <= self._SCAN_LIMIT:
+                for position in xrange(self._start, len(items)):
+                    if items[position] is node:
+                        return position
+                raise ValueError('node is not a child')
+            positions = self._positions = dict((id(child), i) for i, child in enumerate(items) if child is not None)
+
+        position = positions.get(id(node))
+        if position is None or items[position] is not node:
+            raise ValueError('node is not a child')
+        return position
+
+    def _storage(self):
+        # the underlying list for the traversals, removed children are None
+        return self._items
+
+    def _compact(self):
+        if not self._start and not self._holes:
+            return
+        self._items = [child for child in islice(self._items, self._start, None) if child is not None]
+        self._start = self._holes = 0
+        if self._positions is not None:
+            self._positions = dict((id(child), i) for i, child in enumerate(self._items))
+
+
+class NodeBase(object):
+    """Behaviour shared by all node classes, without any instance storage of its own."""
+    __slots__ = ()
 
-class Node(object):
     _PATH_SEP = '/'
+    # mutation listeners, only tree roots have their own list
+    _listeners = ()
 
     def __init__(self, name, data=None):
-        self.name = name
-        self.data = data if data else name
-
         self.parent = None
-        self.children = []
+        self.children = ChildList()
+        self._children_by_name = None
+        # (generation, root, depth, path or None)
+        self._cache = None
+        # structural hash and frozen snapshot, None when not computed yet or stale
+        self._hash = None
+        self._frozen = None
+
+        # a new node has no parent nor listeners, so the property setters are bypassed
+        self._name = name
+        self._data = data if data else name
+
+    @property
+    def name(self):
+        return self._name
+
+    @name.setter
+    def name(self, value):
+        listeners = self.root._listeners
+        for listener in listeners:
+            listener.changing(self)
+        parent = self.parent
+        if parent is not None:
+            parent._unindex_child(self)
+        old_name, self._name = self._name, value
+        self._invalidate_cache()
+        self._invalidate_derived()
+        if parent is not None:
+            parent._index_child(self, rebuild=True)
+        for listener in listeners:
+            listener.renamed(self, old_name)
+
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        old_data, self._data = self._data, value
+        self._invalidate_derived()
+        for listener in self.root._listeners:
+            listener.data_changed(self, old_data)
 
     def set_parent(self, other, force=False):
         if other is None:
@@ -22,53 +296,272 @@ class Node(object):
         else:
             if other is self:
                 raise ValueError('cannot parent node to itself')
-            if other in self.children:
+            if other.parent is self:
                 if force:
-                    self.children.remove(other)
+                    other.unparent()
                 else:
                     raise ValueError('cannot parent node to one of it\'s children')
-            self.parent = other
-            other.children.append(self)
+            old_parent = self.parent
+            root = other.root
+            if old_parent is not None and old_parent.root is root:
+                for listener in root._listeners:
+                    listener.changing(self)
+                self._unlink()
+                self._link(other)
+                for listener in root._listeners:
+                    listener.moved(self, old_parent)
+            else:
+                if old_parent is not None:
+                    self.unparent()
+                self._link(other)
+                for listener in root._listeners:
+                    listener.attached(self)
 
-    def unparent(self):
-        self.parent.children.remove(self)
+    def _link(self, parent):
+        # attach without any validation or listener notification
+        self.parent = parent
+        parent.children.append(self)
+        parent._index_child(self)
+        self._invalidate_cache()
+        parent._invalidate_derived()
+
+    def _unlink(self):
+        # detach without any listener notification
+        parent = self.parent
+        parent.children.remove(self)
+        parent._unindex_child(self)
         self.parent = None
+        self._invalidate_cache()
+        parent._invalidate_derived()
+
+    def unparent(self):
+        parent = self.parent
+        if parent is None:
+            return
+
+        listeners = parent.root._listeners
+        for listener in listeners:
+            listener.changing(self)
+        self._unlink()
+        for listener in listeners:
+            listener.detached(self, parent)
+
+    def get_child(self, name):
+        """Return the first child named `name` or None, without scanning children."""
+        index = self._children_by_name
+        if index is None:
+            return None
+        entry = index.get(name)
+        if isinstance(entry, list):
+            return entry[0]
+        return entry
+
+    def get_children(self, name):
+        """Return the list of children named `name`."""
+        index = self._children_by_name
+        if index is None:
+            return []
+        entry = index.get(name)
+        if isinstance(entry, list):
+            return list(entry)
+        return [] if entry is None else [entry]
+
+    def _index_child(self, child, rebuild=False):
+        # name -> child for unique names, name -> [children] (in children order) for duplicates
+        index = self._children_by_name
+        if index is None:
+            index = self._children_by_name = {}
+        name = child.name
+        entry = index.get(name)
+        if entry is None:
+            index[name] = child
+        elif rebuild:
+            index[name] = [c for c in self.children if c.name == name]
+        elif isinstance(entry, list):
+            entry.append(child)
+        else:
+            index[name] = [entry, child]
+
+    def _unindex_child(self, child):
+        index = self._children_by_name
+        name = child.name
+        entry = index.get(name)
+        if entry is child:
+            del index[name]
+        elif isinstance(entry, list):
+            entry = [c for c in entry if c is not child]
+            index[name] = entry[0] if len(entry) == 1 else entry
 
     def __cmp__(self, other):
         return cmp(self.data, other.data)
 
-    def traverse(self, method=traverse_method.dfs):
-        yield self
+    def traverse(self, method=traverse_method.dfs, with_depth=False, prune=None, max_depth=None):
+        """Iterate over the subtree of this node.
 
-        queue = deque()
-        queue.extend(self.children)
+        :param method: one of `traverse_method`
+        :param with_depth: yield `(depth, node)` pairs, depth being relative to this node
+        :param prune: predicate, nodes for which it is true are skipped with their whole subtree
+        :param max_depth: do not go deeper than this depth
+        """
+        if method == traverse_method.bfs:
+            return self._traverse_bfs(with_depth, prune, max_depth)
+        if method == traverse_method.dfs_post:
+            return self._traverse_post(with_depth, prune, max_depth)
+        return self._traverse_pre(with_depth, prune, max_depth)
 
+    # The traversals walk the children lists in place, holes left by nodes removed meanwhile are skipped.
+    def _traverse_pre(self, with_depth, prune, max_depth):
+        if prune is not None and prune(self):
+            return
+        yield (0, self) if with_depth else self
+        if max_depth is not None and max_depth < 1:
+            return
+
+        stack = [iter(self.children._storage())]
+        while stack:
+            for node in stack[-1]:
+                if node is None or prune is not None and prune(node):
+                    continue
+
+                depth = len(stack)
+                yield (depth, node) if with_depth else node
+                if node.children and (max_depth is None or depth < max_depth):
+                    stack.append(iter(node.children._storage()))
+                    break
+            else:
+                stack.pop()
+
+    def _traverse_bfs(self, with_depth, prune, max_depth):
+        if prune is not None and prune(self):
+            return
+        yield (0, self) if with_depth else self
+        if max_depth is not None and max_depth < 1:
+            return
+
+        queue = deque([(1, self.children._storage())])
         while queue:
-            n = queue.popleft()
-            yield n
-            if method == traverse_method.bfs:  # Breadth-first search
-                queue.extend(n.children)
-            else:  # Depth-first search
-                queue.extendleft(reversed(n.children))
+            depth, children = queue.popleft()
+            descend = max_depth is None or depth < max_depth
+            for node in children:
+                if node is None or prune is not None and prune(node):
+                    continue
+                yield (depth, node) if with_depth else node
+                if descend and node.children:
+                    queue.append((depth + 1, node.children._storage()))
+
+    def _traverse_post(self, with_depth, prune, max_depth):
+        if prune is not None and prune(self):
+            return
+
+        descend = max_depth is None or max_depth > 0
+        stack = [(self, iter(self.children._storage() if descend else ()))]
+        while stack:
+            for node in stack[-1][1]:
+                if node is None or prune is not None and prune(node):
+                    continue
+
+                if node.children and (max_depth is None or len(stack) < max_depth):
+                    stack.append((node, iter(node.children._storage())))
+                    break
+                yield (len(stack), node) if with_depth else node
+            else:
+                node = stack.pop()[0]
+                yield (len(stack), node) if with_depth else node
+
+    def iter_leaves(self):
+        for node in self._traverse_pre(False, None, None):
+            if not node.children:
+                yield node
 
     @property
-    def root(self):
-        parent = self
+    def structural_hash(self):
+        """Merkle hash of the name, data and children (in order) of the subtree of this node.
+
+        Computed lazily, only subtrees changed since the last computation are hashed again. Data is
+        hashed through its `repr`, changes made to data objects in place are not noticed.
+        """
+        if self._hash is None:
+            for node in self._traverse_post(False, _is_hashed, None):
+                h = sha1(repr(node._name))
+                h.update('\0')
+                h.update(repr(node._data))
+                for child in node.children:
+                    h.update(child._hash)
+                node._hash = h.digest()
+        return self._hash
+
+    def structurally_equal(self, other):
+        """Whether the subtrees of both nodes have the same names, data and shape."""
+        return self.structural_hash == other.structural_hash
+
+    def _invalidate_derived(self):
+        # a stale hash or snapshot implies stale ones for all the ancestors
+        node = self
+        while node is not None and (node._hash is not None or node._frozen is not None):
+            node._hash = None
+            node._frozen = None
+            node = node.parent
+
+    def _invalidate_cache(self):
+        # nothing but the node itself depends on the position and name of a leaf
+        global _generation
+        if self.children:
+            _generation += 1
+        else:
+            self._cache = None
+
+    def _cached(self):
+        generation = _generation
+        cache = self._cache
+        if cache is not None and cache[0] == generation:
+            return cache
+
+        # ancestors of a node with a valid cache have valid caches too
+        chain = []
+        node = self
+        while node is not None:
+            cache = node._cache
+            if cache is not None and cache[0] == generation:
+                break
+            chain.append(node)
+            node = node.parent
+        else:
+            node = chain.pop()
+            cache = node._cache = (generation, node._as_root(), 0, None)
 
-        while parent.parent:
-            parent = parent.parent
+        for node in reversed(chain):
+            cache = node._cache = (generation, cache[1], cache[2] + 1, None)
+        return cache
 
-        return parent
+    def _as_root(self):
+        # how the cache of the node and its descendants refers to it as their root
+        return self
+
+    @property
+    def root(self):
+        return self._cached()[1]
+
+    @property
+    def depth(self):
+        return self._cached()[2]
 
     @property
     def path(self):
-        path_elements = [self]
-        parent = self.parent
-        while parent:
-            path_elements.append(parent)
-            parent = parent.parent
+        cache = self._cached()
+        if cache[3] is not None:
+            return cache[3]
 
-        path = self.root._PATH_SEP.join(reversed([i.name for i in path_elements]))
+        chain = []
+        node = self
+        while node is not None and node._cache[3] is None:
+            chain.append(node)
+            node = node.parent
+
+        path = node._cache[3] if node is not None else None
+        sep = self._PATH_SEP
+        for node in reversed(chain):
+            path = node.name if path is None else path + sep + node.name
+            node._cache = node._cache[:3] + (path,)
         return path
 
     @property
@@ -80,21 +573,67 @@ class Node(object):
         children = parent.children
         siblings = []
         for child in children:
-            if child != self:
+            if child is not self:
                 siblings.append(child)
         return siblings
 
     @property
     def leaves(self):
-        leaves = []
-        for node in self.traverse():
-            if not node.children:
-                leaves.append(node)
-        return leaves
+        return list(self.iter_leaves())
 
     def __str__(self):
         return '<{} {}>'.format(type(self).__name__, self.name)
 
 
+class Node(NodeBase):
+    pass
+
+
+class CompactNode(NodeBase):
+    """Node without an instance `__dict__`, for trees with millions of nodes.
+
+    Subclasses must declare `__slots__` for any attribute they add to stay compact.
+    """
+    __slots__ = ('parent', 'children', '_children_by_name', '_name', '_data', '_cache', '_hash', '_frozen',
+                 '__weakref__')
+
+
+class WeakNode(NodeBase):
+    """Compact node referring to its parent and root weakly, so a tree holds no reference cycles.
+
+    A tree of such nodes is freed by reference counting as soon as the tree is dropped, without the
+    cyclic garbage collector. A node keeps its subtree alive but not its ancestors, a node whose
+    ancestors were all freed is a root. Listeners, like indexes and aggregates, still refer to the
+    tree and its nodes.
+    """
+    __slots__ = ('_parent', 'children', '_children_by_name', '_name', '_data', '_cache', '_hash', '_frozen',
+                 '__weakref__')
+
+    @property
+    def parent(self):
+        parent = self._parent
+        return parent() if parent is not None else None
+
+    @parent.setter
+    def parent(self, value):
+        self._parent = ref(value) if value is not None else None
+
+    def _as_root(self):
+        return ref(self)
+
+    def _cached(self):
+        global _generation
+        cache = NodeBase._cached(self)
+        if cache[1]() is None:
+            # the former ancestors were freed, without being detached
+            _generation += 1
+            cache = NodeBase._cached(self)
+        return cache
+
+    @property
+    def root(self):
+        return self._cached()[1]()
+
+
 if __name__ == '__main__':
     pass
@@ -0,0 +1,154 @@
+import heapq
+import multiprocessing
+from array import array
+from itertools import izip
+
+from sapling.node import iter_parents, subtree_ends
+
+
+def encode(node):
+    """Picklable `(base path, names, parent positions, data)` form of the subtree of `node`.
+
+    Nodes are in pre-order, parent positions index into the same lists (-1 for `node`) and the base
+    path is the path of the parent of `node` (None for a root).
+    """
+    names = []
+    parents = []
+    data = []
+    for _, parent, n in iter_parents(node):
+        parents.append(parent)
+        names.append(n.name)
+        data.append(n.data)
+
+    parent = node.parent
+    return parent.path if parent is not None else None, names, array('i', parents), data
+
+
+def split(encoded, parts, sep='/'):
+    """Split an encoded subtree into encoded subtrees of at most `1 / parts` of its size.
+
+    The nodes above those subtrees are returned as single node pieces, largest pieces come first.
+    """
+    base, names, parents, data = encoded
+    ends = subtree_ends(parents)
+
+    def path(i):
+        if i < 0:
+            return base
+        segments = []
+        while i >= 0:
+            segments.append(names[i])
+            i = parents[i]
+        if base is not None:
+            segments.append(base)
+        return sep.join(reversed(segments))
+
+    limit = max(1, len(names) // parts)
+    subtrees = []
+    cut = []
+    stack = [0]
+    while stack:
+        i = stack.pop()
+        end = ends[i]
+        if end - i <= limit:
+            subtrees.append((i, end))
+        else:
+            cut.append(i)
+            child = i + 1
+            while child < end:
+                stack.append(child)
+                child = ends[child]
+
+    subtrees.sort(key=lambda item: item[0] - item[1])
+    pieces = []
+    for start, end in subtrees:
+        rebased = array('i', [-1])
+        rebased.extend(parent - start for parent in parents[start + 1:end])
+        pieces.append((path(parents[start]), names[start:end], rebased, data[start:end]))
+    pieces.extend((path(parents[i]), [names[i]], array('i', [-1]), [data[i]]) for i in cut)
+    return pieces
+
+
+def iter_decoded(pieces, sep='/'):
+    """Yield the `(path, data)` pairs of subtrees returned by `encode` or `split`."""
+    for base, names, parents, data in pieces:
+        paths = []
+        for name, parent, d in izip(names, parents, data):
+            if parent >= 0:
+                path = paths[parent] + sep + name
+            else:
+                path = name if base is None else base + sep + name
+            paths.append(path)
+            yield path, d
+
+
+def _chunks(node, parts):
+    # pieces spread over `parts` chunks of about the same number of nodes
+    sep = node._PATH_SEP
+    heap = [(0, i, []) for i in xrange(parts)]
+    for piece in split(encode(node), parts, sep=sep):
+        size, i, chunk = heapq.heappop(heap)
+        chunk.append(piece)
+        heapq.heappush(heap, (size + len(piece[1]), i, chunk))
+    return [chunk for _, _, chunk in heap if chunk]
+
+
+def _map_chunk(args):
+    fn, sep, chunk = args
+    return [(path, fn(path, data)) for path, data in iter_decoded(chunk, sep=sep)]
+
+
+def _reduce_chunk(args):
+    fn, combine, sep, chunk = args
+    values = iter_decoded(chunk, sep=sep)
+    path, data = next(values)
+    result = fn(path, data)
+    for path, data in values:
+        result = combine(result, fn(path, data))
+    return result
+
+
+def _run(worker, tasks, processes, pool):
+    own_pool = pool is None
+    if own_pool:
+        pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(worker, tasks):
+            yield result
+    finally:
+        if own_pool:
+            pool.terminate()
+            pool.join()
+
+
+def parallel_map(node, fn, processes=None, chunks_per_process=4, pool=None):
+    """Return `{path: fn(path, data)}` for the subtree of `node`, computed in worker processes.
+
+    The subtree is cut into balanced subtrees which are shipped as flat lists of names, parent
+    positions and data, so `fn` and all data must be picklable. Nodes sharing a path keep one of
+    their results. An existing `multiprocessing` pool may be passed as `pool`.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    sep = node._PATH_SEP
+    tasks = [(fn, sep, chunk) for chunk in _chunks(node, processes * chunks_per_process)]
+
+    results = {}
+    for pairs in _run(_map_chunk, tasks, processes, pool):
+        results.update(pairs)
+    return results
+
+
+def parallel_reduce(node, fn, combine, initial=None, processes=None, chunks_per_process=4, pool=None):
+    """Fold `fn(path, data)` of every node of the subtree of `node` with `combine`, in worker processes.
+
+    `combine` must be associative and commutative, partial results are combined in no particular
+    order, starting from `initial` if given. See `parallel_map`.
+    """
+    processes = processes or multiprocessing.cpu_count()
+    sep = node._PATH_SEP
+    tasks = [(fn, combine, sep, chunk) for chunk in _chunks(node, processes * chunks_per_process)]
+
+    result = initial
+    for partial in _run(_reduce_chunk, tasks, processes, pool):
+        result = partial if result is None else combine(result, partial)
+    return result
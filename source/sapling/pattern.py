@@ -0,0 +1,123 @@
+import fnmatch
+import re
+
+_ANY_DEPTH = object()
+
+_cache = {}
+_CACHE_SIZE = 256
+
+
+def compile_pattern(pattern, sep='/'):
+    """Return the compiled, cached `Pattern` for `pattern`."""
+    key = (pattern, sep)
+    compiled = _cache.get(key)
+    if compiled is None:
+        if len(_cache) >= _CACHE_SIZE:
+            _cache.clear()
+        compiled = _cache[key] = Pattern(pattern, sep=sep)
+    return compiled
+
+
+class Pattern(object):
+    """Glob over node paths.
+
+    Segments are matched against node names: `*`, `?` and `[...]` work as in `fnmatch` (case
+    sensitive) and a `**` segment matches any number of nodes, none included. Literal segments are
+    resolved through the children name index, only wildcard segments scan children.
+    """
+
+    def __init__(self, pattern, sep='/'):
+        self.pattern = pattern
+        self.sep = sep
+
+        segments = []
+        for segment in pattern.strip(sep).split(sep):
+            if segment == '**':
+                segments.append(_ANY_DEPTH)
+            elif any(c in segment for c in '*?['):
+                segments.append(re.compile(fnmatch.translate(segment)).match)
+            else:
+                segments.append(segment)
+        self.segments = tuple(segments)
+
+    def _closure(self, states):
+        # a `**` segment may match no node at all
+        segments = self.segments
+        pending = [i for i in states if i < len(segments) and segments[i] is _ANY_DEPTH]
+        while pending:
+            i = pending.pop() + 1
+            if i not in states:
+                states.add(i)
+                if i < len(segments) and segments[i] is _ANY_DEPTH:
+                    pending.append(i)
+        return states
+
+    def _advance(self, states, name):
+        segments = self.segments
+        end = len(segments)
+        advanced = set()
+        for i in states:
+            if i == end:
+                continue
+            segment = segments[i]
+            if segment is _ANY_DEPTH:
+                advanced.add(i)
+            elif isinstance(segment, basestring):
+                if segment == name:
+                    advanced.add(i + 1)
+            elif segment(name):
+                advanced.add(i + 1)
+        return self._closure(advanced)
+
+    def _literal_names(self, states):
+        # names to look up directly if every pending segment is a literal, None otherwise
+        segments = self.segments
+        names = []
+        for i in states:
+            if i == len(segments):
+                continue
+            segment = segments[i]
+            if not isinstance(segment, basestring):
+                return None
+            names.append(segment)
+        return names
+
+    def select(self, node):
+        """Yield the nodes of the subtree of `node` whose path (starting at `node`) matches."""
+        end = len(self.segments)
+        states = self._advance(self._closure({0}), node.name)
+        if not states:
+            return
+
+        stack = [(node, states)]
+        while stack:
+            node, states = stack.pop()
+            if end in states:
+                yield node
+
+            names = self._literal_names(states)
+            if names is not None:
+                children = []
+                for name in set(names):
+                    children.extend(node.get_children(name))
+            else:
+                children = node.children
+
+            matched = []
+            for child in children:
+                child_states = self._advance(states, child.name)
+                if child_states:
+                    matched.append((child, child_states))
+            stack.extend(reversed(matched))
+
+    def match(self, path):
+        """Whether `path` matches the pattern."""
+        states = self._closure({0})
+        for name in path.strip(self.sep).split(self.sep):
+            states = self._advance(states, name)
+            if not states:
+                return False
+        return len(self.segments) in states
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.pattern)
@@ -0,0 +1,386 @@
+from collections import deque
+from itertools import chain
+
+from sapling.node import traverse_method
+from sapling.tree import Tree, printTree
+
+
+class _Chain(object):
+    """Physical node of a `RadixTree`: a run of single-child nodes, its children hang off the last one."""
+    __slots__ = ('labels', 'data', 'parent', 'children', 'children_by_name')
+
+    def __init__(self, labels, parent=None, data=None):
+        self.labels = labels
+        # data of every label, None when all of it is the default (the label itself)
+        self.data = data
+        self.parent = parent
+        # a chain has no children or at least two, single children are merged into it
+        self.children = None
+        self.children_by_name = None
+
+
+class RadixNode(object):
+    """Lightweight view of a single node stored inside a `RadixTree`, the `offset`-th label of a chain."""
+    __slots__ = ('tree', '_chain', '_offset')
+
+    def __init__(self, tree, chain, offset):
+        self.tree = tree
+        self._chain = chain
+        self._offset = offset
+
+    def _resolve(self):
+        chain, offset = self._chain, self._offset = _resolve(self._chain, self._offset)
+        return chain, offset
+
+    @property
+    def name(self):
+        chain, offset = self._resolve()
+        return chain.labels[offset]
+
+    @property
+    def data(self):
+        return _get_data(*self._resolve())
+
+    @data.setter
+    def data(self, value):
+        _set_data(self._resolve(), value)
+
+    @property
+    def parent(self):
+        chain, offset = self._resolve()
+        if offset:
+            return RadixNode(self.tree, chain, offset - 1)
+        parent = chain.parent
+        return RadixNode(self.tree, parent, len(parent.labels) - 1) if parent is not None else None
+
+    @property
+    def children(self):
+        chain, offset = self._resolve()
+        return [RadixNode(self.tree, c, o) for c, o in _children(chain, offset)]
+
+    def get_child(self, name):
+        chain, offset = self._resolve()
+        child = _find_child(chain, offset, name)
+        return RadixNode(self.tree, *child) if child is not None else None
+
+    def traverse(self, method=traverse_method.dfs):
+        tree = self.tree
+        for c, o in _traverse(self._resolve(), method):
+            yield RadixNode(tree, c, o)
+
+    @property
+    def root(self):
+        return self.tree.root
+
+    @property
+    def path(self):
+        chain, offset = self._resolve()
+        names = chain.labels[offset::-1]
+        chain = chain.parent
+        while chain is not None:
+            names.extend(reversed(chain.labels))
+            chain = chain.parent
+        names.reverse()
+        return self.tree._PATH_SEP.join(names)
+
+    @property
+    def siblings(self):
+        parent = self.parent
+        if parent is None:
+            return []
+        return [n for n in parent.children if n != self]
+
+    @property
+    def leaves(self):
+        return [RadixNode(self.tree, c, o) for c, o in _traverse(self._resolve())
+                if not c.children and o == len(c.labels) - 1]
+
+    def __eq__(self, other):
+        return (isinstance(other, RadixNode) and self.tree is other.tree and
+                self._resolve() == other._resolve())
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        # (chain, offset) changes when the chain is split, the path does not
+        return hash((id(self.tree), self.path))
+
+    def __str__(self):
+        return '<{} {}>'.format(type(self).__name__, self.name)
+
+
+def _resolve(chain, offset):
+    # a chain split after a (chain, offset) was taken keeps its head, the tail being its first child
+    while offset >= len(chain.labels):
+        offset -= len(chain.labels)
+        chain = chain.children[0]
+    return chain, offset
+
+
+def _get_data(chain, offset):
+    if chain.data is None or chain.data[offset] is None:
+        return chain.labels[offset]
+    return chain.data[offset]
+
+
+def _set_data(node, value):
+    chain, offset = node
+    if value and value != chain.labels[offset]:
+        if chain.data is None:
+            chain.data = [None] * len(chain.labels)
+        chain.data[offset] = value
+    elif chain.data is not None:
+        chain.data[offset] = None
+
+
+def _children(chain, offset):
+    if offset < len(chain.labels) - 1:
+        return [(chain, offset + 1)]
+    return [(c, 0) for c in chain.children or ()]
+
+
+def _find_child(chain, offset, name):
+    if offset < len(chain.labels) - 1:
+        return (chain, offset + 1) if chain.labels[offset + 1] == name else None
+    if chain.children_by_name is None:
+        return None
+    child = chain.children_by_name.get(name)
+    return (child, 0) if child is not None else None
+
+
+def _traverse(start, method=traverse_method.dfs):
+    """Yield the `(chain, offset)` of the nodes below `start`, a `(chain, offset)` too."""
+    if method == traverse_method.bfs:
+        queue = deque([start])
+        while queue:
+            item = queue.popleft()
+            yield item
+            queue.extend(_children(*item))
+        return
+
+    chain, offset = start
+    if method == traverse_method.dfs_post:
+        # (chain, first offset), the labels of a chain are visited after its children, last first
+        stack = [(chain, offset, iter(chain.children or ()))]
+        while stack:
+            c, first, children = stack[-1]
+            for child in children:
+                stack.append((child, 0, iter(child.children or ())))
+                break
+            else:
+                stack.pop()
+                for o in xrange(len(c.labels) - 1, first - 1, -1):
+                    yield c, o
+        return
+
+    for o in xrange(offset, len(chain.labels)):
+        yield chain, o
+    stack = [iter(chain.children or ())]
+    while stack:
+        for c in stack[-1]:
+            for o in xrange(len(c.labels)):
+                yield c, o
+            if c.children:
+                stack.append(iter(c.children))
+            break
+        else:
+            stack.pop()
+
+
+class RadixTree(object):
+    """Tree storing runs of single-child nodes as one physical node with several labels (a radix tree).
+
+    Logically the same as a `Tree` of the same paths: nodes are handed out as `RadixNode` views and
+    `get_by_path`, `path` and `traverse` behave identically. Physically, a chain of nodes which each
+    have a single child is one `_Chain` whose labels are the node names, and a chain is split when a
+    second child is added to one of its nodes. Views stay valid through splits.
+    """
+    _PATH_SEP = '/'
+
+    def __init__(self, name, data=None):
+        self._root = _Chain([name])
+        self._size = 1
+        self._chains = 1
+        _set_data((self._root, 0), data)
+
+    @classmethod
+    def create_from_paths(cls, paths):
+        paths = iter(paths)
+        for first in paths:
+            break
+        else:
+            raise ValueError('No paths given')
+
+        tree = cls(first.rstrip(cls._PATH_SEP).split(cls._PATH_SEP)[0])
+        tree.insert_many(chain([first], paths))
+
+        return tree
+
+    @classmethod
+    def from_tree(cls, tree):
+        radix = cls(tree.name, tree.data)
+        radix._copy(tree, (radix._root, 0))
+        return radix
+
+    def to_tree(self, tree_cls=Tree):
+        """Rebuild a regular node based tree."""
+        tree = tree_cls(self.name, _get_data(self._root, 0))
+        node_cls = tree._node_cls
+        # (chain, node the chain hangs off, first offset to build)
+        stack = [(self._root, tree, 1)]
+        while stack:
+            chain, node, first = stack.pop()
+            for offset in xrange(first, len(chain.labels)):
+                child = node_cls(chain.labels[offset], _get_data(chain, offset))
+                child._link(node)
+                node = child
+            stack.extend((c, node, 0) for c in reversed(chain.children or ()))
+        return tree
+
+    # storage
+    def _add_child(self, parent, name, data=None):
+        # add a child to the node `parent` (chain, offset), return its (chain, offset)
+        chain, offset = _resolve(*parent)
+        self._size += 1
+        if offset < len(chain.labels) - 1:
+            self._split(chain, offset + 1)
+        elif not chain.children:
+            chain.labels.append(name)
+            if chain.data is not None:
+                chain.data.append(None)
+            child = (chain, len(chain.labels) - 1)
+            _set_data(child, data)
+            return child
+
+        child = _Chain([name], parent=chain)
+        self._chains += 1
+        chain.children.append(child)
+        chain.children_by_name.setdefault(name, child)
+        _set_data((child, 0), data)
+        return child, 0
+
+    def _split(self, chain, at):
+        # move the labels from `at` on to a new chain, the first child of `chain`
+        tail = _Chain(chain.labels[at:], parent=chain, data=chain.data[at:] if chain.data is not None else None)
+        self._chains += 1
+        tail.children = chain.children
+        tail.children_by_name = chain.children_by_name
+        for child in tail.children or ():
+            child.parent = tail
+        del chain.labels[at:]
+        if chain.data is not None:
+            del chain.data[at:]
+        chain.children = [tail]
+        chain.children_by_name = {tail.labels[0]: tail}
+
+    def _copy(self, node, parent):
+        # copy the children (and their subtrees) of `node` below the (chain, offset) `parent`
+        stack = [(node, parent)]
+        while stack:
+            n, p = stack.pop()
+            children = [(child, self._add_child(p, child.name, child.data)) for child in n.children]
+            stack.extend(reversed(children))
+
+    # TreeBase compatible interface
+    @property
+    def root(self):
+        return RadixNode(self, self._root, 0)
+
+    @property
+    def name(self):
+        return self._root.labels[0]
+
+    @property
+    def path(self):
+        return self._root.labels[0]
+
+    @property
+    def children(self):
+        return self.root.children
+
+    @property
+    def physical_size(self):
+        """Number of physical nodes, `len` being the number of logical ones."""
+        return self._chains
+
+    def traverse(self, method=traverse_method.dfs):
+        return self.root.traverse(method=method)
+
+    def __iter__(self):
+        return self.traverse()
+
+    def __len__(self):
+        return self._size
+
+    def get_by_path(self, path):
+        sep = self._PATH_SEP
+        nodes = path.strip(sep).split(sep)
+        if self._root.labels[0] != nodes[0]:
+            return None
+
+        current_node = (self._root, 0)
+        for node in nodes[1:]:
+            current_node = _find_child(current_node[0], current_node[1], node)
+            if current_node is None:
+                return None
+        return RadixNode(self, *current_node)
+
+    def insert(self, path, node=None, force=False):
+        """Same as `TreeBase.insert`, `node` (with its subtree) is copied into the tree."""
+        sep = self._PATH_SEP
+        node_names = path.rstrip(sep).split(sep)
+        if self._root.labels[0] != node_names[0]:
+            return False
+
+        current_node = (self._root, 0)
+        for node_name in node_names[1:]:
+            child = _find_child(current_node[0], current_node[1], node_name)
+            if child is None:
+                if not force:
+                    return False
+                child = self._add_child(current_node, node_name)
+            current_node = child
+
+        if node is not None:
+            self._copy(node, self._add_child(current_node, node.name, node.data))
+        return True
+
+    def insert_many(self, paths):
+        """Bulk insert, see `TreeBase.insert_many`."""
+        sep = self._PATH_SEP
+        root_name = self._root.labels[0]
+
+        created = 0
+        # (chain, offset) of the nodes of the previous path
+        stack = [(self._root, 0)]
+        previous = []
+        for path in paths:
+            node_names = path.rstrip(sep).split(sep)
+            if node_names[0] != root_name:
+                continue
+            node_names = node_names[1:]
+
+            common = 0
+            limit = min(len(node_names), len(previous))
+            while common < limit and node_names[common] == previous[common]:
+                common += 1
+            del stack[common + 1:]
+
+            # the chain of the node may have been split since it was pushed
+            current_node = _resolve(*stack[-1])
+            new = False
+            for node_name in node_names[common:]:
+                child = None if new else _find_child(current_node[0], current_node[1], node_name)
+                if child is None:
+                    child = self._add_child(current_node, node_name)
+                    created += 1
+                    new = True
+                stack.append(child)
+                current_node = child
+            previous = node_names
+
+        return created
+
+    def printout(self, start_node=None, printer=printTree, **kwargs):
+        return printer(start_node or self.root, **kwargs)
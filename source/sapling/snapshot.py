@@ -0,0 +1,94 @@
+from collections import deque
+
+from sapling.node import traverse_method
+
+
+def _is_frozen(node):
+    return node._frozen is not None
+
+
+def freeze(node):
+    """Return the immutable `FrozenNode` of the current state of the subtree of `node`.
+
+    Frozen nodes are cached on the live nodes and dropped along the ancestor chain of every
+    mutation, so only the subtrees changed since the previous call are copied, everything else
+    is shared between the snapshots.
+    """
+    if node._frozen is None:
+        for n in node._traverse_post(False, _is_frozen, None):
+            n._frozen = FrozenNode(n.name, n.data, tuple(child._frozen for child in n.children))
+    return node._frozen
+
+
+class FrozenNode(object):
+    """Node of a snapshot, possibly shared by several snapshots, it must not be modified.
+
+    Frozen nodes do not know their parent, so paths are only available while walking from a
+    snapshot root, see `iter_paths`.
+    """
+    __slots__ = ('name', 'data', 'children', '_children_by_name')
+
+    _PATH_SEP = '/'
+
+    def __init__(self, name, data, children=()):
+        self.name = name
+        self.data = data
+        self.children = children
+        self._children_by_name = None
+
+    def get_child(self, name):
+        index = self._children_by_name
+        if index is None:
+            if len(self.children) < 8:
+                for child in self.children:
+                    if child.name == name:
+                        return child
+                return None
+            index = self._children_by_name = {}
+            for child in reversed(self.children):
+                index[child.name] = child
+        return index.get(name)
+
+    def get_by_path(self, path):
+        sep = self._PATH_SEP
+        nodes = path.strip(sep).split(sep)
+        if self.name != nodes[0]:
+            return None
+
+        current_node = self
+        for node in nodes[1:]:
+            current_node = current_node.get_child(node)
+            if current_node is None:
+                return None
+        return current_node
+
+    def traverse(self, method=traverse_method.dfs):
+        yield self
+
+        queue = deque(self.children)
+        while queue:
+            n = queue.popleft()
+            yield n
+            if method == traverse_method.bfs:  # Breadth-first search
+                queue.extend(n.children)
+            else:  # Depth-first search
+                queue.extendleft(reversed(n.children))
+
+    def __iter__(self):
+        return self.traverse()
+
+    def iter_paths(self):
+        """Yield `(path, node)` pairs in depth-first order."""
+        sep = self._PATH_SEP
+        stack = [(self.name, self)]
+        while stack:
+            path, node = stack.pop()
+            yield path, node
+            stack.extend((path + sep + child.name, child) for child in reversed(node.children))
+
+    @property
+    def leaves(self):
+        return [node for node in self.traverse() if not node.children]
+
+    def __str__(self):
+        return '<{} {}>'.format(type(self).__name__, self.name)
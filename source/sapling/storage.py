@@ -0,0 +1,195 @@
+import cPickle as pickle
+import mmap
+import struct
+import sys
+from array import array
+from itertools import islice, izip
+
+from sapling.lazy import Loader
+from sapling.node import gc_paused, iter_parents, subtree_ends
+
+MAGIC = 'SAPL'
+VERSION = 1
+
+# magic, version, node count, string count, data count
+_HEADER = struct.Struct('<4sIQQQ')
+_UINT32 = struct.Struct('<I')
+_INT32 = struct.Struct('<i')
+_UINT64 = struct.Struct('<Q')
+
+
+def _offsets(count):
+    # arrays have no portable 64 bits typecode
+    return struct.Struct('<{}Q'.format(count))
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def save(node, path):
+    """Write the subtree of `node` to the file `path`.
+
+    Layout, after the header: three pre-order columns of 32 bits integers (name id, subtree size,
+    data id or -1 when the data is the name), the string table of names (offsets then bytes) and
+    the table of pickled data (offsets then bytes), all little endian. Unicode names are stored
+    UTF-8 encoded and read back as byte strings.
+    """
+    name_ids = array('I')
+    data_ids = array('i')
+    parents = []
+    strings = {}
+    names = []
+    blobs = []
+
+    for _, parent, n in iter_parents(node):
+        parents.append(parent)
+
+        name = n.name
+        if isinstance(name, unicode):
+            name = name.encode('utf-8')
+        name_id = strings.get(name)
+        if name_id is None:
+            name_id = strings[name] = len(names)
+            names.append(name)
+        name_ids.append(name_id)
+
+        data = n.data
+        if data is n.name or data == n.name:
+            data_ids.append(-1)
+        else:
+            data_ids.append(len(blobs))
+            blobs.append(pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+    sizes = array('I', (end - i for i, end in enumerate(subtree_ends(parents))))
+
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(name_ids), len(names), len(blobs)))
+        for column in (name_ids, sizes, data_ids):
+            _little_endian(column).tofile(f)
+        for table in (names, blobs):
+            offsets = [0]
+            for item in table:
+                offsets.append(offsets[-1] + len(item))
+            f.write(_offsets(len(offsets)).pack(*offsets))
+            f.write(''.join(table))
+
+
+class MappedTree(object):
+    """Read-only access to the nodes of a saved tree through a memory map, by pre-order position."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.count, string_count, data_count = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self._map.close()
+            if magic != MAGIC:
+                raise ValueError('\'{}\' is not a saved tree'.format(path))
+            raise ValueError('unsupported version {} of \'{}\''.format(version, path))
+
+        self._name_ids = _HEADER.size
+        self._sizes = self._name_ids + 4 * self.count
+        self._data_ids = self._sizes + 4 * self.count
+        self._string_offsets = self._data_ids + 4 * self.count
+        self._strings = self._string_offsets + 8 * (string_count + 1)
+        self._data_offsets = self._strings + _UINT64.unpack_from(self._map, self._strings - 8)[0]
+        self._data = self._data_offsets + 8 * (data_count + 1)
+
+    def close(self):
+        self._map.close()
+
+    def _blob(self, table, offsets, i):
+        start, end = struct.unpack_from('<QQ', self._map, offsets + 8 * i)
+        return self._map[table + start:table + end]
+
+    def name(self, i):
+        return self._blob(self._strings, self._string_offsets, _UINT32.unpack_from(self._map, self._name_ids + 4 * i)[0])
+
+    def data(self, i):
+        data_id = _INT32.unpack_from(self._map, self._data_ids + 4 * i)[0]
+        if data_id < 0:
+            return self.name(i)
+        return pickle.loads(self._blob(self._data, self._data_offsets, data_id))
+
+    def size(self, i):
+        return _UINT32.unpack_from(self._map, self._sizes + 4 * i)[0]
+
+    def children(self, i):
+        """Yield the `(name, data, position)` of the children of the node at position `i`."""
+        end = i + self.size(i)
+        i += 1
+        while i < end:
+            yield self.name(i), self.data(i), i
+            i += self.size(i)
+
+    def load(self, node):
+        # `Loader` callback of the lazy nodes, whose key is their position
+        return self.children(node.key)
+
+
+def load(path, tree_cls):
+    """Read a whole tree saved by `save` as a `tree_cls`."""
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    magic, version, count, string_count, data_count = _HEADER.unpack_from(content)
+    if magic != MAGIC:
+        raise ValueError('\'{}\' is not a saved tree'.format(path))
+    if version != VERSION:
+        raise ValueError('unsupported version {} of \'{}\''.format(version, path))
+
+    offset = _HEADER.size
+    columns = []
+    for typecode in 'IIi':
+        column = array(typecode)
+        column.fromstring(content[offset:offset + 4 * count])
+        columns.append(_little_endian(column))
+        offset += 4 * count
+    name_ids, sizes, data_ids = columns
+
+    string_offsets = _offsets(string_count + 1).unpack_from(content, offset)
+    offset += 8 * (string_count + 1)
+    names = [content[offset + start:offset + end] for start, end in izip(string_offsets, islice(string_offsets, 1, None))]
+    offset += string_offsets[-1]
+    data_offsets = _offsets(data_count + 1).unpack_from(content, offset)
+    offset += 8 * (data_count + 1)
+
+    def data(i):
+        data_id = data_ids[i]
+        if data_id < 0:
+            return names[name_ids[i]]
+        return pickle.loads(content[offset + data_offsets[data_id]:offset + data_offsets[data_id + 1]])
+
+    # data is assigned as is, the constructors would replace falsy data by the name
+    tree = tree_cls(names[name_ids[0]])
+    tree._data = data(0)
+    node_cls = tree._node_cls
+    # (end of subtree, node) of the ancestors of the next node
+    stack = [(sizes[0], tree)]
+    with gc_paused():
+        for i in xrange(1, count):
+            while stack[-1][0] <= i:
+                stack.pop()
+            node = node_cls(names[name_ids[i]])
+            node._data = data(i)
+            node._link(stack[-1][1])
+            if sizes[i] > 1:
+                stack.append((i + sizes[i], node))
+    return tree
+
+
+def open_lazy(path, tree_cls, max_loaded=None):
+    """Open a tree saved by `save` as a lazy `tree_cls`, nodes being read from a memory map when reached.
+
+    The map is closed by `close`, or on leaving the tree used as a context manager.
+    """
+    mapped = MappedTree(path)
+    tree = tree_cls(mapped.name(0), loader=Loader(mapped.load, max_loaded=max_loaded, close=mapped.close))
+    tree._data = mapped.data(0)
+    tree.key = 0
+    return tree
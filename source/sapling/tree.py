@@ -1,39 +1,108 @@
-from sapling.node import Node, traverse_method
+from itertools import chain, islice
+
+from sapling.aggregate import PRESETS, Aggregate
+from sapling.diff import diff, patch
+from sapling.index import IntervalIndex, NameIndex
+from sapling.instrument import instrument, uninstrument
+from sapling.journal import ChangeFeed, replay
+from sapling.lazy import LazyNode
+from sapling.node import Node, NodeBase, gc_paused, traverse_method
+from sapling.pattern import Pattern, compile_pattern
+from sapling.snapshot import freeze
+from sapling.storage import load, open_lazy, save
 
 # cache for all dynamically created tree classes
 _dynamic_tree_classes = {}
 
 
+def _preorder_key(node):
+    # storage positions of the node and its ancestors among their siblings, from the root down
+    key = []
+    parent = node.parent
+    while parent is not None:
+        key.append(parent.children._find(node))
+        node, parent = parent, parent.parent
+    key.reverse()
+    return key
+
+
+def iterTree(start_node,
+             vbar='|',
+             level_hbar='|--',
+             level_last_hbar='`--',
+             level_offset=0,
+             max_depth=None,
+             max_children=None):
+    """Yield the lines of `printTree` one by one, without recursion."""
+    def _children(node):
+        children = node.children
+        total = len(children)
+        shown = total if max_children is None else min(total, max_children)
+        for i, child in enumerate(islice(children, shown)):
+            yield child, i == total - 1
+        if shown < total:
+            yield None, total - shown
+
+    yield str(start_node)
+    if max_depth is not None and max_depth < 1:
+        return
+
+    offset = ' ' * level_offset
+    level_pointer_length = len(level_hbar)
+    next_level_indent = vbar + ' ' * level_pointer_length + offset
+    last_level_indent = ' ' * (level_pointer_length + 1) + offset
+
+    indents = [offset]
+    stack = [_children(start_node)]
+    while stack:
+        item = next(stack[-1], None)
+        if item is None:
+            stack.pop()
+            indents.pop()
+            continue
+
+        child, last_child = item
+        if child is None:
+            yield '{}{} ... ({} more)'.format(''.join(indents), level_last_hbar, last_child)
+            continue
+
+        yield ''.join(indents) + (level_last_hbar if last_child else level_hbar) + ' ' + str(child)
+        if child.children and (max_depth is None or len(stack) < max_depth):
+            indents.append(last_level_indent if last_child else next_level_indent)
+            stack.append(_children(child))
+
+
 def printTree(start_node,
               vbar='|',
               level_hbar='|--',
               level_last_hbar='`--',
-              level_offset=0):
-    def _print(node, level_indent='', next_level_indent='', last_child=False):
-        s = ''
-
-        indent_temp = level_indent + (level_last_hbar if last_child else level_hbar)
-        s += indent_temp + ' ' + str(node) if next_level_indent else str(node)
+              level_offset=0,
+              max_depth=None,
+              max_children=None,
+              stream=None):
+    """Render the subtree of `start_node`.
 
-        level_indent += next_level_indent + ' ' * level_offset
-        level_pointer_length = len(level_hbar)
-        next_level_indent = vbar + ' ' * level_pointer_length
-
-        for i, child in reversed(list(enumerate(reversed(node.children)))):
-            if not i:
-                next_level_indent = ' ' * (level_pointer_length + 1)
-
-            s += '\n' + _print(child,
-                               level_indent=level_indent,
-                               next_level_indent=next_level_indent,
-                               last_child=not bool(i))
-        return s
+    Returns the rendered string, or writes it line by line to `stream` and returns None.
+    """
+    lines = iterTree(start_node,
+                     vbar=vbar,
+                     level_hbar=level_hbar,
+                     level_last_hbar=level_last_hbar,
+                     level_offset=level_offset,
+                     max_depth=max_depth,
+                     max_children=max_children)
+    if stream is None:
+        return '\n'.join(lines)
 
-    return _print(start_node)
+    for line in lines:
+        stream.write(line)
+        stream.write('\n')
 
 
 class TreeBase(Node):
     _node_cls = Node
+    # instrumentation hooks, instrumented trees have their own list
+    _hooks = ()
 
     @classmethod
     def create_from_dict(cls, dct):
@@ -71,6 +140,42 @@ class TreeBase(Node):
 
         return tree
 
+    @classmethod
+    def create_from_paths(cls, paths):
+        """Build a tree from an iterable of paths sharing the same root, see `insert_many`."""
+        paths = iter(paths)
+        for first in paths:
+            break
+        else:
+            raise ValueError('No paths given')
+
+        tree = cls(first.rstrip(TreeBase._PATH_SEP).split(TreeBase._PATH_SEP)[0])
+        tree.insert_many(chain([first], paths))
+
+        return tree
+
+    @classmethod
+    def create_from_arrays(cls, names, parent, data=None):
+        """Build a tree from the rows of `to_arrays` (or any rows listing parents first), needs numpy."""
+        from sapling.arrays import from_arrays
+        return from_arrays(names, parent, cls, data=data)
+
+    @classmethod
+    def create_from_snapshot(cls, snapshot):
+        """Build a new mutable tree from a `FrozenNode` returned by `snapshot`."""
+        # data is assigned as is, the constructors would replace falsy data by the name
+        tree = cls(snapshot.name)
+        tree._data = snapshot.data
+        stack = [(tree, snapshot)]
+        while stack:
+            node, frozen = stack.pop()
+            for child in frozen.children:
+                n = tree._node_cls(child.name)
+                n._data = child.data
+                n._link(node)
+                stack.append((n, child))
+        return tree
+
     def __new__(cls, name, data=None, printer=None, node_cls=None):
         if node_cls:
             if node_cls not in _dynamic_tree_classes:
@@ -87,6 +192,11 @@ class TreeBase(Node):
         super(TreeBase, self).__init__(name, data=data)
 
         self.printer = printer
+        self._listeners = []
+        self._index = None
+        self._interval_index = None
+        self._aggregates = {}
+        self._feed = None
 
     @property
     def root(self):
@@ -99,11 +209,10 @@ class TreeBase(Node):
             return False
 
         current_node = self.root
-        for i, node_name in enumerate(node_names[1:]):
-            for child in current_node.children:
-                if child.name == node_name:
-                    current_node = child
-                    break
+        for node_name in node_names[1:]:
+            child = current_node.get_child(node_name)
+            if child is not None:
+                current_node = child
             else:
                 n = self._node_cls(node_name)
                 if force:
@@ -115,6 +224,187 @@ class TreeBase(Node):
             node.set_parent(current_node)
         return True
 
+    def insert_many(self, paths):
+        """Insert all `paths` as with `insert(path, force=True)` and return the number of created nodes.
+
+        Segments shared with the previous path are not resolved again, so sorted input is the fast path.
+        Paths from another root are skipped.
+        """
+        sep = TreeBase._PATH_SEP
+        root = self.root
+        root_name = root.name
+        node_cls = self._node_cls
+        listeners = root._listeners
+
+        created = 0
+        stack = [root]
+        previous = []
+        with gc_paused():
+            for path in paths:
+                node_names = path.rstrip(sep).split(sep)
+                if node_names[0] != root_name:
+                    continue
+                node_names = node_names[1:]
+
+                common = 0
+                limit = min(len(node_names), len(previous))
+                while common < limit and node_names[common] == previous[common]:
+                    common += 1
+                del stack[common + 1:]
+
+                current_node = stack[-1]
+                first_new = None
+                for node_name in node_names[common:]:
+                    child = None if first_new is not None else current_node.get_child(node_name)
+                    if child is None:
+                        child = node_cls(node_name)
+                        child._link(current_node)
+                        created += 1
+                        if first_new is None:
+                            first_new = child
+                    stack.append(child)
+                    current_node = child
+
+                if first_new is not None:
+                    for listener in listeners:
+                        listener.attached(first_new)
+                previous = node_names
+
+        return created
+
+    # mutation listeners
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def enable_index(self, data=False):
+        """Keep a name (and optionally data) index so `get_all` stops walking the tree."""
+        if self._index is not None:
+            if self._index.by_data is not None or not data:
+                return
+            self.disable_index()
+        self._index = NameIndex(self, data=data)
+        self.add_listener(self._index)
+
+    def disable_index(self):
+        if self._index is not None:
+            self.remove_listener(self._index)
+            self._index = None
+
+    def enable_interval_index(self):
+        """Answer ancestry, subtree and lowest common ancestor queries from pre-order intervals."""
+        if self._interval_index is None:
+            self._interval_index = IntervalIndex(self)
+            self.add_listener(self._interval_index)
+
+    def disable_interval_index(self):
+        if self._interval_index is not None:
+            self.remove_listener(self._interval_index)
+            self._interval_index = None
+
+    # change feed
+    def subscribe(self, callback, batch_size=1):
+        """Deliver the changes of the tree to `callback(operations)`, see `sapling.journal.ChangeFeed`."""
+        if self._feed is None:
+            self._feed = ChangeFeed()
+            self.add_listener(self._feed)
+        self._feed.subscribe(callback, batch_size=batch_size)
+
+    def unsubscribe(self, callback):
+        if self._feed is not None:
+            self._feed.unsubscribe(callback)
+            if not self._feed:
+                self.remove_listener(self._feed)
+                self._feed = None
+
+    def flush_changes(self):
+        """Deliver the operations still pending in subscriber batches."""
+        if self._feed is not None:
+            self._feed.flush()
+
+    def replay(self, path, start=0):
+        """Apply the entries of a `sapling.journal.Journal` from `start` on, see `sapling.journal.replay`."""
+        return replay(self, path, start=start)
+
+    # instrumentation
+    def add_hook(self, hook):
+        """Report operations to `hook(operation, seconds, visited)`, see `sapling.instrument.instrument`."""
+        instrument(self, hook)
+
+    def remove_hook(self, hook):
+        uninstrument(self, hook)
+
+    # aggregates
+    def add_aggregate(self, name, combine=None, value=None, inverse=None):
+        """Maintain an `Aggregate` of every subtree, readable with `aggregate(name, node)`.
+
+        `combine` is a two arguments callable or one of the presets 'size', 'sum', 'min' and 'max'
+        (the default being `name` itself). `value` defaults to the node data.
+        """
+        combine = combine or name
+        if isinstance(combine, basestring):
+            try:
+                combine, preset_value, preset_inverse = PRESETS[combine]
+            except KeyError:
+                raise ValueError('unknown aggregate \'{}\''.format(combine))
+            value = value or preset_value
+            inverse = inverse or preset_inverse
+
+        self.remove_aggregate(name)
+        aggregate = self._aggregates[name] = Aggregate(self, combine, value=value, inverse=inverse)
+        self.add_listener(aggregate)
+        return aggregate
+
+    def remove_aggregate(self, name):
+        aggregate = self._aggregates.pop(name, None)
+        if aggregate is not None:
+            self.remove_listener(aggregate)
+
+    def aggregate(self, name, node=None):
+        return self._aggregates[name][node or self.root]
+
+    # ancestry
+    def is_ancestor(self, ancestor, node):
+        """Whether `node` is in the subtree of `ancestor` (and is not `ancestor` itself)."""
+        if self._interval_index is not None:
+            return self._interval_index.is_ancestor(ancestor, node)
+
+        node = node.parent
+        while node is not None:
+            if node is ancestor:
+                return True
+            node = node.parent
+        return False
+
+    def subtree_size(self, node=None):
+        node = node or self.root
+        if self._interval_index is not None:
+            return self._interval_index.subtree_size(node)
+        return sum(1 for _ in node.traverse())
+
+    def subtree(self, node=None):
+        """List of the nodes in the subtree of `node`, in depth-first pre-order."""
+        node = node or self.root
+        if self._interval_index is not None:
+            return self._interval_index.subtree(node)
+        return list(node.traverse())
+
+    def lca(self, a, b):
+        """Lowest common ancestor of `a` and `b`."""
+        if self._interval_index is not None:
+            return self._interval_index.lca(a, b)
+
+        depth_a, depth_b = a.depth, b.depth
+        for _ in xrange(depth_a - depth_b):
+            a = a.parent
+        for _ in xrange(depth_b - depth_a):
+            b = b.parent
+        while a is not b:
+            a, b = a.parent, b.parent
+        return a
+
     # iterator protocol
     @property
     def depth_iter(self):
@@ -132,6 +422,18 @@ class TreeBase(Node):
         start_node = start_node or self.root
 
         find_by_name = not isinstance(node, self._node_cls)
+        if self._index is not None:
+            hits = self._index.find(node if find_by_name else node.data, by_name=find_by_name)
+            if hits is not None:
+                hits = [n for n in hits
+                        if start_node is self.root or n is start_node or self.is_ancestor(start_node, n)]
+                # in pre-order, as found by walking the tree
+                if len(hits) > 1:
+                    hits.sort(key=_preorder_key)
+                for n in hits:
+                    yield n
+                return
+
         for n in start_node.traverse():
             if find_by_name:
                 if n.name == node:
@@ -152,14 +454,67 @@ class TreeBase(Node):
 
         current_node = self.root
         for node in nodes[1:]:
-            for child in current_node.children:
-                if child.name == node:
-                    current_node = child
-                    break
-            else:
+            current_node = current_node.get_child(node)
+            if current_node is None:
                 return None
         return current_node
 
+    def glob(self, pattern, start_node=None):
+        """Yield the nodes whose path matches `pattern`, see `sapling.pattern.Pattern`.
+
+        With `start_node`, the pattern is matched against paths starting at that node.
+        """
+        if not isinstance(pattern, Pattern):
+            pattern = compile_pattern(pattern, sep=TreeBase._PATH_SEP)
+        return pattern.select(start_node or self.root)
+
+    def select(self, pattern, start_node=None):
+        return list(self.glob(pattern, start_node=start_node))
+
+    # synchronization
+    def snapshot(self):
+        """Immutable `FrozenNode` copy of the tree, sharing unchanged subtrees with earlier snapshots."""
+        return freeze(self.root)
+
+    def diff(self, other):
+        """Operations turning this tree into `other`, see `sapling.diff.diff`."""
+        return diff(self.root, other.root)
+
+    def patch(self, operations):
+        patch(self, operations)
+
+    # persistence
+    def save(self, path):
+        """Write the tree to the file `path`, see `sapling.storage.save`."""
+        save(self.root, path)
+
+    @classmethod
+    def load(cls, path, mmap=False, max_loaded=None):
+        """Read a tree written by `save`.
+
+        With `mmap`, nothing but the root is read: the file is memory mapped and returned as a
+        `LazyTree` (or `cls` if it is one) reading nodes as they are reached, see `LazyNode`. The map
+        stays open until the tree is closed, `with Tree.load(path, mmap=True) as tree:` for instance.
+        """
+        if mmap:
+            return open_lazy(path, cls if issubclass(cls, LazyNode) else LazyTree, max_loaded=max_loaded)
+        return load(path, cls)
+
+    def to_arrays(self, start_node=None):
+        """NumPy columns of the tree, see `sapling.arrays.TreeArrays`."""
+        from sapling.arrays import to_arrays
+        return to_arrays(start_node or self.root)
+
+    # multiprocessing
+    def parallel_map(self, fn, start_node=None, **kwargs):
+        """`{path: fn(path, data)}` computed in worker processes, see `sapling.parallel.parallel_map`."""
+        from sapling.parallel import parallel_map
+        return parallel_map(start_node or self.root, fn, **kwargs)
+
+    def parallel_reduce(self, fn, combine, initial=None, start_node=None, **kwargs):
+        from sapling.parallel import parallel_reduce
+        return parallel_reduce(start_node or self.root, fn, combine, initial=initial, **kwargs)
+
     def __contains__(self, node):
         if isinstance(node, basestring):
             if node.find(TreeBase._PATH_SEP):
@@ -173,11 +528,11 @@ class TreeBase(Node):
             raise IndexError('cannot get the node \'{}\' inside the tree'.format(index))
         return item
 
-    def printout(self, start_node=None, printer=None):
+    def printout(self, start_node=None, printer=None, **kwargs):
         start_node = start_node or self.root
         printer = printer or self.printer
 
-        return printer(start_node)
+        return printer(start_node, **kwargs)
 
 
 class TreeMeta(type):
@@ -187,8 +542,9 @@ class TreeMeta(type):
 
     def __new__(mcs, name, bases, dct):
         cls = super(TreeMeta, mcs).__new__(mcs, name, bases, dct)
+        # the first node class mixed in next to the tree, Node if there is none
         for c in cls.mro():
-            if issubclass(c, Node) and not issubclass(c, TreeBase):
+            if issubclass(c, NodeBase) and not issubclass(c, TreeBase) and c not in TreeBase.__mro__:
                 cls._node_cls = c
                 break
 
@@ -201,6 +557,31 @@ class Tree(TreeBase):
     __metaclass__ = TreeMeta
 
 
+class LazyTree(Tree, LazyNode):
+    """Tree whose nodes are `LazyNode`s, loaded from `loader` as they are reached."""
+
+    def __new__(cls, name, data=None, printer=None, node_cls=None, loader=None):
+        return super(LazyTree, cls).__new__(cls, name, data=data, printer=printer, node_cls=node_cls)
+
+    def __init__(self, name, data=None, printer=printTree, node_cls=None, loader=None):
+        super(LazyTree, self).__init__(name, data=data, printer=printer, node_cls=node_cls)
+        if loader is not None and loader.node_cls is None:
+            loader.node_cls = self._node_cls
+        self._loader = loader
+        self._loaded = loader is None
+
+    def close(self):
+        """Close the source of the nodes, the memory map of a tree opened by `load` for instance."""
+        if self._loader is not None:
+            self._loader.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
 if __name__ == '__main__':
     pass
 
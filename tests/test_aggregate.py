@@ -0,0 +1,74 @@
+import operator
+import unittest
+
+from sapling import Node, Tree
+
+
+class Test_Aggregate(unittest.TestCase):
+    @staticmethod
+    def create_tree():
+        t = Tree('a', data=1)
+        t.insert_many(['a/b/c', 'a/b/d', 'a/e/f'])
+        for i, node in enumerate(t):
+            node.data = i + 1
+        return t
+
+    def check(self, t):
+        for node in t:
+            values = [n.data for n in node.traverse()]
+            self.assertEqual(t.aggregate('size', node), len(values))
+            self.assertEqual(t.aggregate('sum', node), sum(values))
+            self.assertEqual(t.aggregate('max', node), max(values))
+            self.assertEqual(t.aggregate('product', node), reduce(operator.mul, values))
+
+    def test_aggregates(self):
+        t = self.create_tree()
+        t.add_aggregate('size')
+        t.add_aggregate('sum')
+        t.add_aggregate('max')
+        t.add_aggregate('product', operator.mul)
+        self.assertEqual(t.aggregate('sum'), 21)
+        self.check(t)
+
+        t['a/b/c'].data = 10
+        self.check(t)
+
+        t['a/b'].set_parent(t['a/e/f'])
+        self.check(t)
+
+        # moved to an ancestor of its old parent
+        t['a/e/f/b/c'].set_parent(t['a/e'])
+        self.check(t)
+
+        t['a/e'].unparent()
+        self.assertEqual(t.aggregate('size'), 1)
+        self.check(t)
+
+        x = Node('x', data=3)
+        Node('y', data=4).set_parent(x)
+        t.insert('a', node=x)
+        self.check(t)
+
+    def test_move_to_ancestor(self):
+        t = Tree.create_from_paths(['r/a/b/c'])
+        t.add_aggregate('longest', max, value=lambda n: len(n.name))
+        t['r/a/b/c'].data = 'ccc'
+        t['r/a/b/c'].name = 'ccc'
+        t['r/a/b/ccc'].set_parent(t['r/a'])
+        self.assertEqual(t.aggregate('longest', t['r/a/b']), 1)
+        self.assertEqual(t.aggregate('longest', t['r/a']), 3)
+        self.assertEqual(t.aggregate('longest'), 3)
+
+    def test_unknown(self):
+        t = self.create_tree()
+        with self.assertRaises(ValueError):
+            t.add_aggregate('foo')
+
+        t.add_aggregate('total', 'sum')
+        t.remove_aggregate('total')
+        with self.assertRaises(KeyError):
+            t.aggregate('total')
+
+
+if __name__ == '__main__':
+    unittest.main()
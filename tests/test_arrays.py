@@ -0,0 +1,78 @@
+import random
+import subprocess
+import sys
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from sapling import Tree
+from sapling.arrays import depth_histogram, leaf_mask, subtree_sums
+
+
+@unittest.skipIf(numpy is None, 'numpy is not installed')
+class Test_Arrays(unittest.TestCase):
+    def setUp(self):
+        self.tree = Tree.create_from_paths(['a/b/c', 'a/b/d', 'a/e/c', 'a/e/f/c'])
+        for i, node in enumerate(self.tree):
+            node.data = i
+
+    def test_to_arrays(self):
+        arrays = self.tree.to_arrays()
+        self.assertEqual(arrays.nodes, list(self.tree))
+        self.assertEqual(arrays.names, ['a', 'b', 'c', 'd', 'e', 'c', 'f', 'c'])
+        self.assertEqual(arrays.parent.tolist(), [-1, 0, 1, 1, 0, 4, 4, 6])
+        self.assertEqual(arrays.depth.tolist(), [0, 1, 2, 2, 1, 2, 2, 3])
+        self.assertEqual(arrays.size.tolist(), [8, 3, 1, 1, 4, 1, 2, 1])
+        self.assertEqual(arrays.data.tolist(), range(8))
+
+        self.tree['a/b'].data = 'b'
+        self.assertIsNone(self.tree.to_arrays().data)
+
+    def test_operations(self):
+        arrays = self.tree.to_arrays()
+        self.assertEqual(subtree_sums(arrays).tolist(), [28, 6, 2, 3, 22, 5, 13, 7])
+        self.assertEqual(subtree_sums(arrays, numpy.ones(8)).tolist(), arrays.size.tolist())
+        self.assertEqual(depth_histogram(arrays).tolist(), [1, 2, 4, 1])
+        self.assertEqual(leaf_mask(arrays).tolist(), [not n.children for n in self.tree])
+
+    def test_against_tree(self):
+        rnd = random.Random(0)
+        t = Tree.create_from_paths('r/' + '/'.join(str(rnd.randint(0, 3)) for _ in xrange(rnd.randint(1, 6)))
+                                   for _ in xrange(300))
+        for node in t:
+            node.data = rnd.randint(-5, 5)
+        t.add_aggregate('sum')
+        t.add_aggregate('size')
+        arrays = t.to_arrays()
+
+        self.assertEqual(subtree_sums(arrays).tolist(), [t.aggregate('sum', n) for n in arrays.nodes])
+        self.assertEqual(arrays.size.tolist(), [t.aggregate('size', n) for n in arrays.nodes])
+        self.assertEqual(arrays.depth.tolist(), [n.depth for n in arrays.nodes])
+        depths = [n.depth for n in t]
+        self.assertEqual(depth_histogram(arrays).tolist(), [depths.count(d) for d in xrange(max(depths) + 1)])
+        self.assertEqual([arrays.nodes[p] if p >= 0 else None for p in arrays.parent], [n.parent for n in t])
+
+        # zeros are kept, not replaced by the names
+        copy = Tree.create_from_arrays(arrays.names, arrays.parent, data=arrays.data)
+        self.assertEqual([(n.path, n.data) for n in copy], [(n.path, n.data) for n in t])
+
+    def test_create_from_arrays(self):
+        arrays = self.tree.to_arrays()
+        copy = Tree.create_from_arrays(arrays.names, arrays.parent, data=arrays.data)
+        self.assertEqual([(n.path, n.data) for n in copy], [(n.path, n.data) for n in self.tree])
+        self.assertRaises(ValueError, Tree.create_from_arrays, ['a', 'b'], [-1, 1])
+
+
+class Test_Imports(unittest.TestCase):
+    def test_optional_modules(self):
+        # numpy and multiprocessing are imported by the operations using them only
+        loaded = subprocess.check_output([sys.executable, '-c', 'import sys, sapling; '
+                                          'print [m for m in ("numpy", "multiprocessing") if m in sys.modules]'])
+        self.assertEqual(loaded.strip(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
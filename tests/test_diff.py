@@ -0,0 +1,78 @@
+import unittest
+
+from sapling import Node, Tree
+from sapling.diff import DataChange, Insert, Move, Remove, ranked_path, resolve
+
+
+class Test_Diff(unittest.TestCase):
+    paths = ['a/b/c', 'a/b/d/e', 'a/f/g', 'a/f/h', 'a/i']
+
+    @staticmethod
+    def content(tree):
+        return sorted((n.path, n.data) for n in tree)
+
+    def test_identical(self):
+        self.assertEqual(Tree.create_from_paths(self.paths).diff(Tree.create_from_paths(self.paths)), [])
+
+    def test_diff(self):
+        old = Tree.create_from_paths(self.paths)
+        new = Tree.create_from_paths(self.paths)
+        new['a/b/c'].data = 'x'
+        new['a/b/d'].set_parent(new['a/f'])
+        new['a/i'].unparent()
+        new.insert('a/j/k', force=True)
+        new['a/j/k'].data = 0
+
+        operations = old.diff(new)
+        self.assertItemsEqual(operations, [DataChange('a/b/c', 'c', 'x'),
+                                           Move('a/b/d', 'a/f/d'),
+                                           Remove('a/i'),
+                                           Insert('a/j', ('j', 'j', (('k', 0, ()),)))])
+
+        replica = Tree.create_from_paths(self.paths)
+        replica.patch(operations)
+        self.assertEqual(self.content(replica), self.content(new))
+
+    @staticmethod
+    def duplicates(*data):
+        t = Tree.create_from_paths(['r/p'])
+        for d in data:
+            Node('x', data=d).set_parent(t['r/p'])
+        return t
+
+    def test_duplicate_names(self):
+        old = self.duplicates('d1', 'd2', 'd3')
+        new = self.duplicates('d1', 'x2')
+        self.assertEqual(ranked_path(old['r/p'].children[2]), 'r/p/x[2]')
+        self.assertIs(resolve(old, 'r/p/x[1]'), old['r/p'].children[1])
+
+        operations = old.diff(new)
+        self.assertEqual(operations, [DataChange('r/p/x[1]', 'd2', 'x2'), Remove('r/p/x[2]')])
+        old.patch(operations)
+        self.assertEqual([n.data for n in old['r/p'].children], ['d1', 'x2'])
+
+        # removes and moves of several same-named siblings
+        old = self.duplicates('d1', 'd2', 'd3')
+        new = self.duplicates('d1')
+        Node('x', data='d2').set_parent(new['r'])
+        old.patch(old.diff(new))
+        self.assertEqual([(n.path, n.data) for n in old], [(n.path, n.data) for n in new])
+
+    def test_bracket_names(self):
+        t = Tree.create_from_paths(['r/a[1]'])
+        Node('a[1]').set_parent(t['r'])
+        self.assertEqual(ranked_path(t['r'].children[0]), 'r/a[1][0]')
+        self.assertEqual(ranked_path(t['r'].children[1]), 'r/a[1][1]')
+        self.assertIs(resolve(t, 'r/a[1][1]'), t['r'].children[1])
+        self.assertIsNone(resolve(t, 'r/a[1]'))
+
+    def test_errors(self):
+        old = Tree.create_from_paths(self.paths)
+        with self.assertRaises(ValueError):
+            old.diff(Tree('x'))
+        with self.assertRaises(ValueError):
+            old.patch([Remove('a/x')])
+
+
+if __name__ == '__main__':
+    unittest.main()
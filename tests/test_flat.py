@@ -0,0 +1,68 @@
+import unittest
+
+from sapling import FlatTree, Node, Tree, printTree, traverse_method
+
+
+class Test_FlatTree(unittest.TestCase):
+    paths = ['a/b/c', 'a/b/d', 'a/e/f', 'a/e/g/h', 'a/i']
+
+    def test_create_from_paths(self):
+        flat = FlatTree.create_from_paths(self.paths)
+        tree = Tree.create_from_paths(self.paths)
+
+        self.assertEqual(len(flat), 9)
+        self.assertEqual([n.path for n in flat.traverse()], [n.path for n in tree.traverse()])
+        self.assertEqual([n.path for n in flat.traverse(method=traverse_method.bfs)],
+                         [n.path for n in tree.traverse(method=traverse_method.bfs)])
+        self.assertEqual(flat.printout(), printTree(tree).replace('Tree', 'FlatNode').replace('<Node', '<FlatNode'))
+
+    def test_get_by_path(self):
+        flat = FlatTree.create_from_paths(self.paths)
+
+        node = flat.get_by_path('a/e/g')
+        self.assertEqual(node.path, 'a/e/g')
+        self.assertEqual(node.parent, flat.get_by_path('a/e'))
+        self.assertEqual([n.name for n in node.parent.children], ['f', 'g'])
+        self.assertEqual([n.name for n in node.siblings], ['f'])
+        self.assertEqual([n.path for n in flat.root.leaves], ['a/b/c', 'a/b/d', 'a/e/f', 'a/e/g/h', 'a/i'])
+        self.assertIsNone(flat.get_by_path('a/e/x'))
+        self.assertIsNone(flat.get_by_path('x'))
+
+    def test_insert(self):
+        flat = FlatTree('a')
+        self.assertFalse(flat.insert('a/b'))
+        self.assertTrue(flat.insert('a/b/c', force=True))
+
+        sub = Node('x', data=1)
+        Node('y').set_parent(sub)
+        self.assertTrue(flat.insert('a/b', node=sub))
+        self.assertEqual(flat.get_by_path('a/b/x').data, 1)
+        self.assertEqual([n.path for n in flat], ['a', 'a/b', 'a/b/c', 'a/b/x', 'a/b/x/y'])
+
+    def test_many_children(self):
+        flat = FlatTree.create_from_paths('a/c{}'.format(i) for i in xrange(100))
+        self.assertEqual(flat.get_by_path('a/c99').path, 'a/c99')
+        self.assertIn(0, flat._children_by_name)
+        self.assertIsNone(flat.get_by_path('a/x'))
+
+        # the index follows later children
+        self.assertTrue(flat.insert('a/x/y', force=True))
+        self.assertEqual(flat.get_by_path('a/x/y').path, 'a/x/y')
+        self.assertEqual(len(flat.get_by_path('a').children), 101)
+
+    def test_insert_order(self):
+        flat = FlatTree('r')
+        sub = Tree.create_from_paths(['x/a', 'x/b', 'x/c/d', 'x/c/e'])
+        self.assertTrue(flat.insert('r', node=sub))
+        self.assertEqual([n.path for n in flat], ['r'] + ['r/' + n.path for n in sub])
+
+    def test_tree_round_trip(self):
+        tree = Tree.create_from_paths(self.paths)
+        tree['a/e/f'].data = 'data'
+        back = FlatTree.from_tree(tree).to_tree()
+
+        self.assertEqual([(n.path, n.data) for n in back], [(n.path, n.data) for n in tree])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+from sapling import Node, Tree
+from sapling import instrument
+from sapling.instrument import Stats
+from sapling.node import NodeBase
+
+
+class Test_Instrument(unittest.TestCase):
+    def test_stats(self):
+        t = Tree.create_from_paths(['a/b/c', 'a/b/d', 'a/e'])
+        stats = Stats()
+        t.add_hook(stats)
+
+        t.insert('a/e/f/g', force=True)
+        t.get_by_path('a/b/c')
+        self.assertEqual(len(list(t.traverse())), 7)
+        list(t.get_all('c'))
+        Node('x').set_parent(t['a/b'])
+
+        result = stats.as_dict()
+        self.assertEqual(result['insert']['calls'], 1)
+        self.assertEqual(result['get_by_path']['visited'], 5)
+        self.assertEqual(result['traverse']['calls'], 2)
+        self.assertEqual(result['traverse']['visited'], 14)
+        self.assertEqual(result['get_all']['visited'], 1)
+        self.assertEqual(result['set_parent']['calls'], 3)
+        self.assertGreater(result['traverse']['seconds'], 0)
+
+    def test_keyword_arguments(self):
+        t = Tree.create_from_paths(['a/b'])
+        stats = Stats()
+        t.add_hook(stats)
+        self.assertTrue(t.insert(path='a/c/d', force=True))
+        self.assertEqual(t.get_by_path(path='a/c').path, 'a/c')
+        self.assertEqual(stats.visited['insert'], 3)
+        self.assertEqual(stats.visited['get_by_path'], 2)
+        t.remove_hook(stats)
+
+    def test_failing_counter(self):
+        counters = instrument._COUNTERS
+        instrument._COUNTERS = dict(counters, insert=lambda tree, args, kwargs, result: 1 / 0)
+        try:
+            t = Tree('a')
+            stats = Stats()
+            t.add_hook(stats)
+        finally:
+            instrument._COUNTERS = counters
+        # the call succeeded, so does the probe
+        self.assertTrue(t.insert('a/b', force=True))
+        self.assertEqual((stats.calls['insert'], stats.visited['insert']), (1, 0))
+        t.remove_hook(stats)
+
+    def test_remove_hook(self):
+        set_parent = NodeBase.__dict__['set_parent']
+        t = Tree('a')
+        other = Tree('b')
+        stats = Stats()
+        t.add_hook(stats)
+        other.add_hook(stats)
+        t.remove_hook(stats)
+        self.assertNotIn('get_by_path', vars(t))
+        self.assertIsNot(NodeBase.__dict__['set_parent'], set_parent)
+
+        other.remove_hook(stats)
+        t.insert('a/b', force=True)
+        Node('c').set_parent(t)
+        self.assertEqual(stats.as_dict(), {})
+        self.assertIs(NodeBase.__dict__['set_parent'], set_parent)
+
+
+if __name__ == '__main__':
+    unittest.main()
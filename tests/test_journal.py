@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from sapling import ConcurrentTree, Journal, Node, Tree
+from sapling.diff import DataChange, Insert, Move, Remove, Rename
+from sapling.journal import read
+
+
+class Test_ChangeFeed(unittest.TestCase):
+    paths = ['a/b/c', 'a/b/d', 'a/e']
+
+    @staticmethod
+    def content(tree):
+        return [(n.path, n.data) for n in tree]
+
+    def mutate(self, t):
+        t.insert('a/e/f/g', force=True)
+        t['a/b/d'].set_parent(t['a/e'])
+        t['a/b/c'].data = 'x'
+        t['a/e'].name = 'h'
+        t['a/b'].unparent()
+
+    def test_operations(self):
+        t = Tree.create_from_paths(self.paths)
+        batches = []
+        t.subscribe(batches.append)
+        self.mutate(t)
+
+        self.assertEqual([operation for batch in batches for operation in batch],
+                         [Insert('a/e/f', ('f', 'f', ())),
+                          Insert('a/e/f/g', ('g', 'g', ())),
+                          Move('a/b/d', 'a/e/d'),
+                          DataChange('a/b/c', 'c', 'x'),
+                          Rename('a/e', 'h'),
+                          Remove('a/b')])
+
+        replica = Tree.create_from_paths(self.paths)
+        replica.patch(operation for batch in batches for operation in batch)
+        self.assertEqual(self.content(replica), self.content(t))
+
+    def test_duplicate_names(self):
+        t = Tree.create_from_paths(['r/p', 'r/q'])
+        replica = Tree.create_from_paths(['r/p', 'r/q'])
+        operations = []
+        t.subscribe(operations.extend)
+        for d in ('d1', 'd2', 'd3'):
+            Node('x', data=d).set_parent(t['r/p'])
+        t['r/p'].children[1].data = 'y'
+        t['r/p'].children[0].unparent()
+        t['r/p'].children[1].set_parent(t['r/q'])
+        t['r/p'].children[0].name = 'z'
+
+        self.assertIn(DataChange('r/p/x[1]', 'd2', 'y'), operations)
+        replica.patch(operations)
+        self.assertEqual(self.content(replica), self.content(t))
+
+    def test_move_below_duplicate_name(self):
+        for source, target in ((1, 2), (0, 2), (2, 0)):
+            t = Tree('r')
+            for d in ('d0', 'd1', 'd2'):
+                Node('y', data=d).set_parent(t.root)
+            replica = Tree.create_from_snapshot(t.snapshot())
+            operations = []
+            t.subscribe(operations.extend)
+            children = list(t.root.children)
+            children[source].set_parent(children[target])
+
+            replica.patch(operations)
+            self.assertEqual(self.content(replica), self.content(t))
+            self.assertEqual(replica.diff(t), [])
+
+    def test_batches(self):
+        t = Tree.create_from_paths(self.paths)
+        batches = []
+        t.subscribe(batches.append, batch_size=4)
+        self.mutate(t)
+        self.assertEqual([len(batch) for batch in batches], [4])
+        t.flush_changes()
+        self.assertEqual([len(batch) for batch in batches], [4, 2])
+
+        t.unsubscribe(batches.append)
+        self.assertIsNone(t._feed)
+        self.assertNotIn(None, t._listeners)
+        t.insert('a/x', force=True)
+        self.assertEqual(len(batches), 2)
+
+    def test_moved_indexed(self):
+        t = Tree.create_from_paths(self.paths)
+        t.enable_index()
+        t.add_aggregate('size')
+        t['a/b/d'].set_parent(t['a/e'])
+        self.assertEqual(list(t.get_all('d')), [t['a/e/d']])
+        self.assertEqual(t.aggregate('size', t['a/b']), 2)
+        self.assertEqual(t.aggregate('size', t['a/e']), 2)
+
+
+class Test_Journal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal.jsonl')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replay(self):
+        paths = ['a/b/c', 'a/b/d']
+        t = Tree.create_from_paths(paths)
+        replica = Tree.create_from_paths(paths)
+        journal = Journal(self.path)
+        t.subscribe(journal, batch_size=2)
+
+        t.insert('a/e/f', force=True)
+        t['a/b/c'].data = {'size': 1}
+        t['a/b/d'].set_parent(t['a/e'])
+        t.flush_changes()
+        position = replica.replay(self.path)
+        self.assertEqual(position, 4)
+        self.assertEqual([(n.path, n.data) for n in replica], [(n.path, n.data) for n in t])
+
+        # catching up replays the new entries only
+        t['a/e'].name = 'g'
+        t['a/b'].unparent()
+        t.flush_changes()
+        self.assertEqual(replica.replay(self.path, start=position), 6)
+        self.assertEqual([(n.path, n.data) for n in replica], [(n.path, n.data) for n in t])
+        self.assertTrue(replica.structurally_equal(t))
+        self.assertEqual(replica.diff(t), [])
+        journal.close()
+
+    def test_concurrent_replay(self):
+        t = ConcurrentTree('a')
+        journal = Journal(self.path)
+        t.subscribe(journal)
+        t.insert('a/b/c', force=True)
+        journal.close()
+
+        replica = ConcurrentTree('a')
+        patch = replica.patch
+        locked = []
+
+        def checked(operations):
+            locked.append(replica.lock._writer is not None)
+            patch(operations)
+        replica.patch = checked
+        self.assertEqual(replica.replay(self.path), 2)
+        self.assertEqual(locked, [True, True])
+        self.assertTrue(replica.structurally_equal(t))
+
+    def test_reopen(self):
+        journal = Journal(self.path)
+        journal([Remove('a/b'), Move('a/c', 'a/d/c')])
+        journal.close()
+        # an interrupted write
+        with open(self.path, 'a') as f:
+            f.write('{"op": "Remove"')
+
+        journal = Journal(self.path)
+        self.assertEqual(journal.sequence, 2)
+        journal([Rename('a/d', 'e')])
+        journal.close()
+        self.assertEqual(list(read(self.path, start=1)), [(1, Move('a/c', 'a/d/c')), (2, Rename('a/d', 'e'))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import threading
+import time
+import unittest
+from itertools import islice
+
+from sapling import LazyTree, Loader, printTree
+from sapling.node import traverse_method
+
+
+class Test_LazyTree(unittest.TestCase):
+    hierarchy = {
+        'a': ['b', 'c'],
+        'a/b': ['d', ('e', 5)],
+        'a/c': ['f'],
+    }
+
+    def create_tree(self, max_loaded=None):
+        self.loaded = []
+
+        def load(node):
+            self.loaded.append(node.path)
+            return self.hierarchy.get(node.path, [])
+
+        return LazyTree('a', loader=Loader(load, max_loaded=max_loaded))
+
+    def test_get_by_path(self):
+        t = self.create_tree()
+        self.assertEqual(t.get_by_path('a/b/e').data, 5)
+        self.assertEqual(self.loaded, ['a', 'a/b'])
+        self.assertIsNone(t.get_by_path('a/c/x'))
+        self.assertEqual(self.loaded, ['a', 'a/b', 'a/c'])
+
+    def test_traverse(self):
+        t = self.create_tree()
+        self.assertEqual([n.path for n in t.traverse(method=traverse_method.bfs)],
+                         ['a', 'a/b', 'a/c', 'a/b/d', 'a/b/e', 'a/c/f'])
+        self.assertEqual(len(self.loaded), 6)
+        self.assertEqual(printTree(t).count('\n'), 5)
+
+        list(t.traverse())
+        self.assertEqual(len(self.loaded), 6)
+
+    def test_insert(self):
+        t = self.create_tree()
+        self.assertTrue(t.insert('a/c/g/h', force=True))
+        self.assertEqual([n.name for n in t['a/c'].children], ['f', 'g'])
+        self.assertEqual(self.loaded, ['a', 'a/c'])
+
+    def test_eviction(self):
+        t = self.create_tree(max_loaded=2)
+        b = t.get_by_path('a/b')
+        d = t.get_by_path('a/b/d')
+        d.children
+        t.get_by_path('a/c/f').children
+        self.assertLessEqual(len(t._loader), 3)
+        self.assertFalse(b.loaded)
+        self.assertIsNone(d.parent)
+
+        # reloaded on demand
+        self.assertEqual(t.get_by_path('a/b/e').data, 5)
+        self.assertEqual(self.loaded.count('a/b'), 2)
+
+    def test_hash_after_reload(self):
+        t = self.create_tree(max_loaded=2)
+        structural_hash = t.structural_hash
+        snapshot = t.snapshot()
+        for path in ('a/c/f', 'a/b/d', 'a/b/e', 'a/c'):
+            t.get_by_path(path).children
+        # reloaded
+        self.assertGreater(self.loaded.count('a/b'), 1)
+        self.assertEqual(t.structural_hash, structural_hash)
+
+        t.get_by_path('a/b/d').data = 'x'
+        self.assertNotEqual(t.structural_hash, structural_hash)
+        self.assertNotEqual(t.snapshot(), snapshot)
+
+    def test_changed_nodes_stay_loaded(self):
+        t = self.create_tree(max_loaded=1)
+        t.get_by_path('a/b/d').data = 'x'
+        for path in ('a/c/f', 'a/b/e', 'a/c'):
+            t.get_by_path(path).children
+        self.assertEqual(t.get_by_path('a/b/d').data, 'x')
+        self.assertEqual(self.loaded.count('a/b'), 1)
+
+    def test_eviction_during_bfs(self):
+        def load(node):
+            return [] if node.depth == 3 else ['x{}'.format(i) for i in xrange(3)]
+
+        expected = [n.path for n in LazyTree('a', loader=Loader(load)).traverse(method=traverse_method.bfs)]
+        for concurrently in (False, True):
+            t = LazyTree('a', loader=Loader(load, max_loaded=2))
+            traverse = t.traverse_concurrently if concurrently else t.traverse
+            self.assertEqual([n.path for n in traverse(method=traverse_method.bfs)], expected)
+            # released once done, so the nodes can be unloaded again
+            self.assertFalse(any(n._holds for n in t.traverse()))
+            # a clock pass clears the referenced marks of the traversal, the next one unloads
+            t._loader._evict()
+            t._loader._evict()
+            self.assertFalse(t.loaded)
+
+    def test_eviction_during_dfs(self):
+        def load(node):
+            return [] if node.depth == 4 else ['x0', 'x1']
+
+        for method in (traverse_method.dfs, traverse_method.dfs_post):
+            expected = [n.path for n in LazyTree('a', loader=Loader(load)).traverse(method=method)]
+            for concurrently in (False, True):
+                # fewer loaded nodes than the depth, lookups unload the nodes not on the stack
+                t = LazyTree('a', loader=Loader(load, max_loaded=2))
+                traverse = t.traverse_concurrently if concurrently else t.traverse
+                paths = []
+                for node in islice(traverse(method=method), len(expected) + 1):
+                    paths.append(node.path)
+                    t.get_by_path('a/x1/x1/x1').children
+                self.assertEqual(paths, expected)
+                self.assertFalse(any(n._holds for n in t.traverse()))
+
+    def test_traverse_concurrently(self):
+        lock = threading.Lock()
+        active = [0, 0]
+
+        def load(node):
+            with lock:
+                active[0] += 1
+                active[1] = max(active)
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            return [] if node.depth == 2 else ['x{}'.format(i) for i in xrange(4)]
+
+        for method in (traverse_method.dfs, traverse_method.bfs, traverse_method.dfs_post):
+            expected = [n.path for n in LazyTree('a', loader=Loader(load)).traverse(method=method)]
+            active[1] = 0
+            t = LazyTree('a', loader=Loader(load))
+            self.assertEqual([n.path for n in t.traverse_concurrently(method=method, concurrency=3)], expected)
+            self.assertEqual(active[1], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
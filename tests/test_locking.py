@@ -0,0 +1,163 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from sapling import ConcurrentTree, RWLock
+
+
+def path_length(path, data):
+    return len(path)
+
+
+class Test_RWLock(unittest.TestCase):
+    def test_shared_readers(self):
+        lock = RWLock()
+        reading = threading.Event()
+        done = threading.Event()
+
+        def reader():
+            with lock.read_locked():
+                reading.set()
+                done.wait(5)
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        reading.wait(5)
+        with lock.read_locked():
+            done.set()
+        thread.join()
+
+    def test_exclusive_writer(self):
+        lock = RWLock()
+        events = []
+
+        def writer():
+            with lock.write_locked():
+                events.append('write')
+
+        with lock.read_locked():
+            thread = threading.Thread(target=writer)
+            thread.start()
+            thread.join(0.1)
+            events.append('read')
+        thread.join()
+        self.assertEqual(events, ['read', 'write'])
+
+    def test_reentrancy(self):
+        lock = RWLock()
+        with lock.write_locked():
+            with lock.write_locked():
+                with lock.read_locked():
+                    pass
+        with lock.read_locked():
+            with lock.read_locked():
+                self.assertRaises(RuntimeError, lock.acquire_write)
+        with lock.write_locked():
+            pass
+
+
+class Test_ConcurrentTree(unittest.TestCase):
+    def assertWaitsForWriter(self, t, call):
+        # `call` takes the read lock, it does not finish while another thread writes
+        writing = threading.Event()
+        done = threading.Event()
+        events = []
+
+        def writer():
+            with t.write_locked():
+                writing.set()
+                done.wait(5)
+                events.append('write')
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        writing.wait(5)
+        reader = threading.Thread(target=lambda: events.append(call()))
+        reader.start()
+        reader.join(0.1)
+        done.set()
+        reader.join()
+        thread.join()
+        self.assertEqual(events[0], 'write')
+
+    def test_readers_and_writers(self):
+        t = ConcurrentTree.create_from_paths('a/b{}/c'.format(i) for i in xrange(50))
+        errors = []
+
+        def write(branch):
+            try:
+                for i in xrange(200):
+                    t.insert('a/b{}/w{}'.format(branch, i), force=True)
+            except Exception as e:
+                errors.append(e)
+
+        def read():
+            try:
+                for _ in xrange(20):
+                    for node in t.traverse():
+                        node.name
+                    t.get_by_path('a/b1/c')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in xrange(4)]
+        threads += [threading.Thread(target=read) for _ in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(list(t)), 1 + 50 * 2 + 4 * 200)
+
+    def test_traverse_holds_read_lock(self):
+        t = ConcurrentTree.create_from_paths(['a/b', 'a/c'])
+        nodes = t.traverse()
+        next(nodes)
+        self.assertRaises(RuntimeError, t.insert, 'a/d', force=True)
+        nodes.close()
+        self.assertTrue(t.insert('a/d', force=True))
+
+    def test_direct_mutation(self):
+        t = ConcurrentTree.create_from_paths(['a/b/c', 'a/d'])
+        with t.write_locked():
+            t['a/b/c'].set_parent(t['a/d'])
+        self.assertEqual(t.get_by_path('a/d/c').path, 'a/d/c')
+        self.assertEqual(sorted(n.name for n in t.get_all('c')), ['c'])
+
+    def test_rebuild_during_interval_query(self):
+        t = ConcurrentTree.create_from_paths(['a/b/c', 'a/d/e'])
+        t.enable_interval_index()
+        index = t._interval_index
+        build_lifting = index._build_lifting
+
+        def racing(intervals):
+            # another reader, which found the index stale too, publishes its build meanwhile
+            index._intervals = index._build()
+            return build_lifting(intervals)
+        index._build_lifting = racing
+        self.assertIs(t.lca(t['a/b/c'], t['a/d/e']), t)
+        self.assertIs(t.lca(t['a/b/c'], t['a/d']), t)
+
+    def test_save_reads_locked(self):
+        t = ConcurrentTree.create_from_paths(['a/b/c', 'a/d'])
+        directory = tempfile.mkdtemp()
+        try:
+            self.assertWaitsForWriter(t, lambda: t.save(os.path.join(directory, 'tree')))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_to_arrays_reads_locked(self):
+        t = ConcurrentTree.create_from_paths(['a/b/c', 'a/d'])
+        self.assertWaitsForWriter(t, t.to_arrays)
+
+    def test_parallel_reads_locked(self):
+        t = ConcurrentTree.create_from_paths(['a/b/c', 'a/d'])
+        self.assertWaitsForWriter(t, lambda: t.parallel_map(path_length, processes=2))
+        self.assertWaitsForWriter(t, lambda: t.parallel_reduce(path_length, max, initial=0, processes=2))
+
+
+if __name__ == '__main__':
+    unittest.main()
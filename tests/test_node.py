@@ -1,6 +1,8 @@
 import unittest
+import weakref
 
-from sapling import Node, traverse_method
+from sapling import CompactNode, Node, Tree, WeakNode, gc_paused, traverse_method
+from sapling.node import ChildList, iter_parents, subtree_ends
 
 
 class Test_Node(unittest.TestCase):
@@ -43,6 +45,17 @@ class Test_Node(unittest.TestCase):
         self.assertIs(b, a.parent)
         self.assertIn(a, b.children)
 
+    def test_reparent(self):
+        a = Node('a')
+        b = Node('b')
+        c = Node('c')
+        c.set_parent(a)
+        c.set_parent(b)
+        self.assertIs(c.parent, b)
+        self.assertNotIn(c, a.children)
+        self.assertIsNone(a.get_child('c'))
+        self.assertIs(b.get_child('c'), c)
+
     def test_unparent(self):
         a = Node('a')
         b = Node('b')
@@ -55,6 +68,23 @@ class Test_Node(unittest.TestCase):
         b.set_parent(None)
         self.assertIs(b.parent, None)
 
+    def test_get_child(self):
+        a, b, c, d, e, f = self.create_network()
+
+        self.assertIs(a.get_child('b'), b)
+        self.assertIs(a.get_child('c'), c)
+        self.assertIsNone(a.get_child('d'))
+
+        e.name = 'x'
+        self.assertIsNone(c.get_child('e'))
+        self.assertIs(c.get_child('x'), e)
+
+        f.name = 'x'
+        self.assertIs(c.get_child('x'), e)
+        e.unparent()
+        self.assertIs(c.get_child('x'), f)
+        self.assertSequenceEqual(c.children, [f])
+
     def test_cmp(self):
         a1 = Node('a')
         a2 = Node('a')
@@ -70,6 +100,42 @@ class Test_Node(unittest.TestCase):
         self.assertSequenceEqual(list(a.traverse()), [a, b, d, c, e, f])
         self.assertSequenceEqual(list(a.traverse(method=traverse_method.bfs)), [a, b, c, d, e, f])
 
+    def test_traverse_options(self):
+        a, b, c, d, e, f = self.create_network()
+
+        self.assertSequenceEqual(list(a.traverse(method=traverse_method.dfs_post)), [d, b, e, f, c, a])
+        self.assertSequenceEqual(list(a.traverse(with_depth=True)),
+                                 [(0, a), (1, b), (2, d), (1, c), (2, e), (2, f)])
+        self.assertSequenceEqual(list(a.traverse(method=traverse_method.dfs_post, with_depth=True)),
+                                 [(2, d), (1, b), (2, e), (2, f), (1, c), (0, a)])
+        self.assertSequenceEqual(list(a.traverse(method=traverse_method.bfs, with_depth=True)),
+                                 [(0, a), (1, b), (1, c), (2, d), (2, e), (2, f)])
+
+        for method in (traverse_method.dfs, traverse_method.bfs, traverse_method.dfs_post):
+            self.assertItemsEqual(list(a.traverse(method=method, prune=lambda n: n is b)), [a, c, e, f])
+            self.assertItemsEqual(list(a.traverse(method=method, max_depth=1)), [a, b, c])
+            self.assertItemsEqual(list(a.traverse(method=method, max_depth=0)), [a])
+            self.assertItemsEqual(list(a.traverse(method=method, prune=lambda n: n is a)), [])
+
+    def test_traverse_mutation(self):
+        a, b, c, d, e, f = self.create_network()
+
+        visited = []
+        for node in a.traverse():
+            visited.append(node)
+            if node is e:
+                node.unparent()
+        self.assertSequenceEqual(visited, [a, b, d, c, e, f])
+        self.assertSequenceEqual(c.children, [f])
+
+    def test_traverse_deep(self):
+        nodes = [Node(str(i)) for i in range(5000)]
+        for parent, child in zip(nodes, nodes[1:]):
+            child.set_parent(parent)
+
+        self.assertEqual(len(list(nodes[0].traverse(method=traverse_method.dfs_post))), 5000)
+        self.assertSequenceEqual(list(nodes[0].iter_leaves()), [nodes[-1]])
+
     def test_root(self):
         a, b, c, d, e, f = self.create_network()
 
@@ -90,6 +156,46 @@ class Test_Node(unittest.TestCase):
         self.assertEqual(e.path, 'a/c/e')
         self.assertEqual(f.path, 'a/c/f')
 
+    def test_unparent_identity(self):
+        a = Node('a')
+        b = Node('b', data='x')
+        c = Node('c', data='x')
+        b.set_parent(a)
+        c.set_parent(a)
+        self.assertSequenceEqual(b.siblings, [c])
+
+        c.unparent()
+        self.assertSequenceEqual(a.children, [b])
+        self.assertIs(b.parent, a)
+
+        c.set_parent(a)
+        b.set_parent(c)
+        self.assertSequenceEqual(a.children, [c])
+
+    def test_depth(self):
+        a, b, c, d, e, f = self.create_network()
+
+        self.assertEqual([n.depth for n in (a, b, c, d, e, f)], [0, 1, 1, 2, 2, 2])
+
+    def test_cache_invalidation(self):
+        a, b, c, d, e, f = self.create_network()
+        self.assertEqual(f.path, 'a/c/f')
+
+        c.set_parent(b)
+        self.assertEqual((f.path, f.depth), ('a/b/c/f', 3))
+        b.name = 'x'
+        self.assertEqual(f.path, 'a/x/c/f')
+        f.name = 'y'
+        self.assertEqual(f.path, 'a/x/c/y')
+
+        b.unparent()
+        self.assertEqual((f.path, f.depth), ('x/c/y', 2))
+        self.assertIs(f.root, b)
+        self.assertIs(a.root, a)
+
+        f.set_parent(a)
+        self.assertEqual((f.path, f.depth), ('a/y', 1))
+
     def test_siblings(self):
         a, b, c, d, e, f = self.create_network()
 
@@ -107,10 +213,123 @@ class Test_Node(unittest.TestCase):
         self.assertSequenceEqual(d.leaves, [d])
         self.assertSequenceEqual(c.leaves, [e, f])
 
+    def test_structural_hash(self):
+        a1 = self.create_network()[0]
+        a2, b, c, d, e, f = self.create_network()
+        self.assertTrue(a1.structurally_equal(a2))
+        self.assertFalse(a1.structurally_equal(b))
+
+        f.data = 'x'
+        self.assertFalse(a1.structurally_equal(a2))
+        f.data = 'f'
+        self.assertTrue(a1.structurally_equal(a2))
+
+        hash_b = b.structural_hash
+        e.set_parent(b)
+        self.assertEqual(d.structural_hash, a1.children[0].children[0].structural_hash)
+        self.assertNotEqual(b.structural_hash, hash_b)
+        self.assertFalse(a1.structurally_equal(a2))
+        e.set_parent(c)
+        f.set_parent(c)
+        self.assertTrue(a1.structurally_equal(a2))
+
+        d.name = 'x'
+        self.assertFalse(a1.structurally_equal(a2))
+
+    def test_iter_parents(self):
+        t = Tree.create_from_paths(['a/b/c', 'a/b/d', 'a/e'])
+        encoded = list(iter_parents(t))
+        self.assertEqual([(depth, parent, n.name) for depth, parent, n in encoded],
+                         [(0, -1, 'a'), (1, 0, 'b'), (2, 1, 'c'), (2, 1, 'd'), (1, 0, 'e')])
+        self.assertEqual(list(subtree_ends([parent for _, parent, _ in encoded])), [5, 4, 3, 4, 5])
+
     def test_str(self):
         a = Node('a')
         self.assertEqual(a.__str__(), '<Node a>')
 
 
+class Test_ChildList(unittest.TestCase):
+    def test_remove(self):
+        nodes = [Node(str(i)) for i in range(100)]
+        children = ChildList(nodes)
+        for node in nodes[:10] + nodes[90:] + nodes[20:80:2]:
+            children.remove(node)
+        expected = nodes[10:20] + nodes[21:80:2] + nodes[80:90]
+
+        self.assertEqual(len(children), len(expected))
+        self.assertIs(children[0], expected[0])
+        self.assertIs(children[-1], expected[-1])
+        self.assertEqual(list(children), expected)
+        self.assertEqual(list(reversed(children)), expected[::-1])
+        self.assertEqual(children.index(nodes[21]), 10)
+        self.assertNotIn(nodes[20], children)
+        with self.assertRaises(ValueError):
+            children.remove(nodes[20])
+
+        for node in expected:
+            children.remove(node)
+        self.assertFalse(children)
+        self.assertEqual(children, [])
+
+    def test_identity(self):
+        a = Node('a')
+        b = Node('a')
+        children = ChildList([a])
+        self.assertIn(a, children)
+        self.assertNotIn(b, children)
+        with self.assertRaises(ValueError):
+            children.remove(b)
+
+
+class Test_CompactNode(unittest.TestCase):
+    def test_compact(self):
+        a = CompactNode('a')
+        b = CompactNode('b', data=1)
+        b.set_parent(a)
+        self.assertIs(a.get_child('b'), b)
+        self.assertEqual(b.path, 'a/b')
+        with self.assertRaises(AttributeError):
+            a.foo = 1
+
+    def test_tree(self):
+        t = Tree('a', node_cls=CompactNode)
+        t.insert('a/b/c', force=True)
+        self.assertIs(type(t['a/b/c']), CompactNode)
+
+        class CompactTree(Tree, CompactNode):
+            pass
+
+        t = CompactTree('a')
+        t.insert('a/b/c', force=True)
+        self.assertIs(type(t['a/b/c']), CompactNode)
+
+
+class Test_WeakNode(unittest.TestCase):
+    def test_weak_parent(self):
+        t = Tree('a', node_cls=WeakNode)
+        t.insert('a/b/c', force=True)
+        c = t['a/b/c']
+        self.assertIs(c.parent, t['a/b'])
+        self.assertIs(c.root, t)
+        self.assertEqual(c.path, 'a/b/c')
+        self.assertEqual(c.depth, 2)
+
+    def test_freed_without_gc(self):
+        with gc_paused():
+            t = Tree('a', node_cls=WeakNode)
+            t.insert_many(['a/b/c', 'a/b/d', 'a/e'])
+            t['a/b/c'].path
+            leaf = weakref.ref(t['a/b/d'])
+            b = t['a/b']
+
+            del t
+            self.assertIsNone(b.parent)
+            self.assertIs(b.root, b)
+            self.assertEqual(b.get_child('c').path, 'b/c')
+
+            del b
+            self.assertIsNone(leaf())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,44 @@
+import operator
+import unittest
+
+from sapling import Tree
+from sapling.parallel import encode, iter_decoded, split
+
+
+def path_length(path, data):
+    return len(path)
+
+
+class Test_Parallel(unittest.TestCase):
+    def setUp(self):
+        self.tree = Tree.create_from_paths('a/b{}/c{}/d'.format(i, j) for i in xrange(8) for j in xrange(8))
+
+    def test_encode(self):
+        node = self.tree['a/b3']
+        self.assertEqual(list(iter_decoded([encode(node)])), [(n.path, n.data) for n in node.traverse()])
+        self.assertEqual(list(iter_decoded([encode(self.tree)])), [(n.path, n.data) for n in self.tree])
+
+    def test_split(self):
+        pieces = split(encode(self.tree), 8)
+        expected = sorted((n.path, n.data) for n in self.tree)
+        self.assertEqual(sorted(iter_decoded(pieces)), expected)
+        self.assertLessEqual(max(len(names) for _, names, _, _ in pieces), len(expected) // 8)
+
+        self.assertEqual(sorted(iter_decoded(split(encode(self.tree), 1))), expected)
+
+    def test_parallel_map(self):
+        results = self.tree.parallel_map(path_length, processes=2)
+        self.assertEqual(results, dict((n.path, len(n.path)) for n in self.tree))
+
+        start_node = self.tree['a/b1']
+        results = self.tree.parallel_map(path_length, start_node=start_node, processes=2)
+        self.assertEqual(sorted(results), sorted(n.path for n in start_node.traverse()))
+
+    def test_parallel_reduce(self):
+        total = self.tree.parallel_reduce(path_length, operator.add, processes=2)
+        self.assertEqual(total, sum(len(n.path) for n in self.tree))
+        self.assertEqual(self.tree.parallel_reduce(path_length, operator.add, initial=10, processes=2), total + 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from sapling import Tree
+from sapling.pattern import Pattern, compile_pattern
+
+
+class Test_Pattern(unittest.TestCase):
+    paths = ['root/a/logs/error-1',
+             'root/a/logs/2016/error-2',
+             'root/a/logs/info-1',
+             'root/b/logs/error-3',
+             'root/b/data/error-4',
+             'root/c']
+
+    def select(self, pattern):
+        t = Tree.create_from_paths(self.paths)
+        return [n.path for n in t.glob(pattern)]
+
+    def test_literal(self):
+        self.assertEqual(self.select('root/b/logs/error-3'), ['root/b/logs/error-3'])
+        self.assertEqual(self.select('root/x'), [])
+        self.assertEqual(self.select('x'), [])
+
+    def test_wildcards(self):
+        self.assertEqual(self.select('root/*/logs/error-*'), ['root/a/logs/error-1', 'root/b/logs/error-3'])
+        self.assertEqual(self.select('root/?'), ['root/a', 'root/b', 'root/c'])
+        self.assertEqual(self.select('root/[bc]'), ['root/b', 'root/c'])
+
+    def test_any_depth(self):
+        self.assertEqual(self.select('root/*/logs/**/error-*'),
+                         ['root/a/logs/error-1', 'root/a/logs/2016/error-2', 'root/b/logs/error-3'])
+        self.assertEqual(self.select('root/**/error-4'), ['root/b/data/error-4'])
+        self.assertEqual(len(self.select('**')), 13)
+        self.assertEqual(self.select('root/**/logs'), ['root/a/logs', 'root/b/logs'])
+
+    def test_start_node(self):
+        t = Tree.create_from_paths(self.paths)
+        self.assertEqual([n.path for n in t.glob('a/**/error-*', start_node=t['root/a'])],
+                         ['root/a/logs/error-1', 'root/a/logs/2016/error-2'])
+
+    def test_match(self):
+        pattern = Pattern('root/*/logs/**/error-*')
+        self.assertTrue(pattern.match('root/a/logs/error-1'))
+        self.assertTrue(pattern.match('root/a/logs/x/y/error-1'))
+        self.assertFalse(pattern.match('root/a/b/logs/error-1'))
+
+    def test_cache(self):
+        self.assertIs(compile_pattern('root/*'), compile_pattern('root/*'))
+
+
+if __name__ == '__main__':
+    unittest.main()
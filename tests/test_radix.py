@@ -0,0 +1,72 @@
+import unittest
+
+from sapling import Node, RadixTree, Tree, printTree, traverse_method
+
+
+class Test_RadixTree(unittest.TestCase):
+    paths = ['a/b/c/d', 'a/b/c/e/f/g', 'a/b/x', 'a/h/i']
+
+    def test_create_from_paths(self):
+        radix = RadixTree.create_from_paths(self.paths)
+        tree = Tree.create_from_paths(self.paths)
+
+        self.assertEqual(len(radix), 10)
+        # a, b, c, d, e/f/g, x, h/i
+        self.assertEqual(radix.physical_size, 7)
+        for method in (traverse_method.dfs, traverse_method.bfs, traverse_method.dfs_post):
+            self.assertEqual([n.path for n in radix.traverse(method=method)],
+                             [n.path for n in tree.traverse(method=method)])
+        self.assertEqual([n.path for n in radix.get_by_path('a/b/c').traverse(method=traverse_method.dfs_post)],
+                         [n.path for n in tree['a/b/c'].traverse(method=traverse_method.dfs_post)])
+        self.assertEqual(radix.printout(), printTree(tree).replace('Tree', 'RadixNode').replace('<Node', '<RadixNode'))
+
+    def test_get_by_path(self):
+        radix = RadixTree.create_from_paths(self.paths)
+
+        node = radix.get_by_path('a/b/c/e/f')
+        self.assertEqual(node.path, 'a/b/c/e/f')
+        self.assertEqual(node.parent, radix.get_by_path('a/b/c/e'))
+        self.assertEqual([n.name for n in node.children], ['g'])
+        self.assertEqual([n.name for n in radix.get_by_path('a/b').children], ['c', 'x'])
+        self.assertEqual([n.name for n in radix.get_by_path('a/b/x').siblings], ['c'])
+        self.assertEqual([n.path for n in radix.root.leaves], ['a/b/c/d', 'a/b/c/e/f/g', 'a/b/x', 'a/h/i'])
+        self.assertIsNone(radix.get_by_path('a/b/c/e/x'))
+        self.assertIsNone(radix.get_by_path('a/b/c/e/f/g/x'))
+        self.assertIsNone(radix.get_by_path('x'))
+
+    def test_split(self):
+        radix = RadixTree('a')
+        self.assertFalse(radix.insert('a/b'))
+        self.assertTrue(radix.insert('a/b/c/d', force=True))
+        self.assertEqual(radix.physical_size, 1)
+
+        c = radix.get_by_path('a/b/c')
+        c.data = 'data'
+        views = set([c, radix.get_by_path('a/b/c/d')])
+        # splits the chain after c, views of it stay valid
+        self.assertTrue(radix.insert('a/b/c/e', force=True))
+        self.assertEqual(radix.physical_size, 3)
+        self.assertEqual((c.path, c.data), ('a/b/c', 'data'))
+        self.assertEqual(c, radix.get_by_path('a/b/c'))
+        self.assertIn(radix.get_by_path('a/b/c/d'), views)
+        self.assertEqual([n.path for n in c.children], ['a/b/c/d', 'a/b/c/e'])
+
+        sub = Node('x', data=1)
+        Node('y').set_parent(sub)
+        self.assertTrue(radix.insert('a/b', node=sub))
+        self.assertEqual(radix.get_by_path('a/b/x').data, 1)
+        self.assertEqual([n.path for n in radix], ['a', 'a/b', 'a/b/c', 'a/b/c/d', 'a/b/c/e', 'a/b/x', 'a/b/x/y'])
+        self.assertEqual(radix.physical_size, 5)
+
+    def test_tree_round_trip(self):
+        tree = Tree.create_from_paths(self.paths)
+        tree['a/b/c/e/f'].data = 'data'
+        radix = RadixTree.from_tree(tree)
+        self.assertEqual(radix.physical_size, 7)
+        back = radix.to_tree()
+
+        self.assertEqual([(n.path, n.data) for n in back], [(n.path, n.data) for n in tree])
+
+
+if __name__ == '__main__':
+    unittest.main()
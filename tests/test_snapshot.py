@@ -0,0 +1,42 @@
+import unittest
+
+from sapling import Tree, printTree
+
+
+class Test_Snapshot(unittest.TestCase):
+    paths = ['a/b/c', 'a/b/d', 'a/e/f']
+
+    def test_snapshot(self):
+        t = Tree.create_from_paths(self.paths)
+        first = t.snapshot()
+        self.assertIs(t.snapshot(), first)
+        self.assertEqual([path for path, _ in first.iter_paths()], [n.path for n in t])
+        self.assertEqual(printTree(first), printTree(t).replace('Tree', 'FrozenNode').replace('<Node', '<FrozenNode'))
+
+        t['a/b/c'].data = 'x'
+        t.insert('a/b/g', force=True)
+        t['a/e/f'].unparent()
+        second = t.snapshot()
+
+        self.assertEqual(first.get_by_path('a/b/c').data, 'c')
+        self.assertIsNotNone(first.get_by_path('a/e/f'))
+        self.assertIsNone(first.get_by_path('a/b/g'))
+        self.assertEqual(second.get_by_path('a/b/c').data, 'x')
+        self.assertIsNone(second.get_by_path('a/e/f'))
+        self.assertEqual([n.name for n in second.get_by_path('a/b').children], ['c', 'd', 'g'])
+
+        # unchanged subtrees are shared
+        self.assertIs(first.get_by_path('a/b/d'), second.get_by_path('a/b/d'))
+
+    def test_create_from_snapshot(self):
+        t = Tree.create_from_paths(self.paths)
+        t['a/e'].data = 1
+        t.data = 0
+        t['a/b'].data = ''
+        copy = Tree.create_from_snapshot(t.snapshot())
+        self.assertEqual([(n.path, n.data) for n in copy], [(n.path, n.data) for n in t])
+        self.assertTrue(copy.structurally_equal(t))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+import unittest
+
+from sapling import LazyTree, Tree
+
+
+class Test_Storage(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tree.sapling')
+
+        self.tree = Tree.create_from_paths(['a/b/c', 'a/b/d', 'a/e/c', 'a/e/f/c', u'a/ż'.encode('utf-8')])
+        self.tree['a/e'].data = {'size': 3}
+        self.tree['a/b/d'].data = 1.5
+        # falsy data, not to be confused with the default
+        self.tree['a/e/c'].data = 0
+        self.tree['a/b/c'].data = ''
+        self.tree.save(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_load(self):
+        t = Tree.load(self.path)
+        self.assertIs(type(t), Tree)
+        self.assertEqual([(n.path, n.data) for n in t], [(n.path, n.data) for n in self.tree])
+        self.assertTrue(t.structurally_equal(self.tree))
+
+    def test_load_mmap(self):
+        t = Tree.load(self.path, mmap=True)
+        self.assertIsInstance(t, LazyTree)
+        self.assertEqual(t.get_by_path('a/e').data, {'size': 3})
+        self.assertEqual(t._loader.loads, 1)
+        self.assertFalse(t.get_by_path('a/b').loaded)
+
+        self.assertEqual([(n.path, n.data) for n in t], [(n.path, n.data) for n in self.tree])
+        self.assertTrue(t.structurally_equal(self.tree))
+        t.close()
+
+    def test_close_mmap(self):
+        with Tree.load(self.path, mmap=True) as t:
+            self.assertEqual(t.get_by_path('a/e/c').data, 0)
+        # loaded nodes stay readable, the others cannot be loaded anymore
+        self.assertEqual(t.get_by_path('a/e/c').data, 0)
+        self.assertRaises(ValueError, t.get_by_path, 'a/b/c')
+        t.close()
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write('x' * 64)
+        self.assertRaises(ValueError, Tree.load, self.path)
+        self.assertRaises(ValueError, Tree.load, self.path, mmap=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 import unittest
+from StringIO import StringIO
 
-from sapling import Tree, traverse_method
+from sapling import Tree, iterTree, printTree, traverse_method
 
 
 class Test_TreeBase(unittest.TestCase):
@@ -10,6 +11,134 @@ class Test_TreeBase(unittest.TestCase):
         self.assertEqual(t.name, 'a')
         self.assertSequenceEqual([c.name for c in t.children], ['b', 'e'])
 
+    def test_insert(self):
+        t = Tree('a')
+        self.assertFalse(t.insert('a/b/c'))
+        self.assertTrue(t.insert('a/b/c', force=True))
+        self.assertTrue(t.insert('a/b/d', force=True))
+        self.assertFalse(t.insert('x/b'))
+        self.assertEqual(len(t.children), 1)
+        self.assertSequenceEqual([c.name for c in t.children[0].children], ['c', 'd'])
+
+    def test_get_by_path(self):
+        t = Tree('a')
+        t.insert('a/b/c', force=True)
+        self.assertIs(t.get_by_path('a'), t)
+        self.assertEqual(t.get_by_path('a/b/c').path, 'a/b/c')
+        self.assertIsNone(t.get_by_path('a/b/x'))
+        self.assertIsNone(t.get_by_path('x/b'))
+
+    def test_create_from_paths(self):
+        paths = ['a/b/c', 'a/b/d', 'a/e', 'a/b/c/g', 'x/y', 'a/b/d/']
+        t = Tree.create_from_paths(paths)
+        self.assertEqual([n.path for n in t], ['a', 'a/b', 'a/b/c', 'a/b/c/g', 'a/b/d', 'a/e'])
+
+        t.enable_index()
+        self.assertEqual(t.insert_many(['a/e/f', 'a/e/f/h', 'a/b/c']), 2)
+        self.assertIs(t.get('h'), t['a/e/f/h'])
+
+        with self.assertRaises(ValueError):
+            Tree.create_from_paths([])
+
+    @staticmethod
+    def create_tree():
+        t = Tree('a')
+        for path in ('a/b/c', 'a/b/d', 'a/e/c', 'a/e/f/c'):
+            t.insert(path, force=True)
+        return t
+
+    def test_get_all(self):
+        t = self.create_tree()
+        self.assertEqual([n.path for n in t.get_all('c')], ['a/b/c', 'a/e/c', 'a/e/f/c'])
+        self.assertEqual([n.path for n in t.get_all('c', start_node=t['a/e'])], ['a/e/c', 'a/e/f/c'])
+        self.assertIs(t.get('d'), t['a/b/d'])
+        self.assertIsNone(t.get('x'))
+
+    def test_index(self):
+        t = self.create_tree()
+        t.enable_index(data=True)
+
+        self.assertEqual([n.path for n in t.get_all('c')], ['a/b/c', 'a/e/c', 'a/e/f/c'])
+        self.assertEqual([n.path for n in t.get_all('c', start_node=t['a/e'])], ['a/e/c', 'a/e/f/c'])
+
+        t['a/e/f'].unparent()
+        self.assertEqual([n.path for n in t.get_all('c')], ['a/b/c', 'a/e/c'])
+
+        t.insert('a/e/g/h', force=True)
+        t['a/e/g/h'].name = 'c'
+        self.assertEqual([n.path for n in t.get_all('c')], ['a/b/c', 'a/e/c', 'a/e/g/c'])
+        self.assertIsNone(t.get('h'))
+
+        node = t['a/b/d']
+        node.data = 'x'
+        self.assertEqual(list(t.get_all(Tree._node_cls('y', data='x'))), [node])
+
+        t.disable_index()
+        self.assertEqual({n.path for n in t.get_all('c')}, {'a/b/c', 'a/e/c', 'a/e/g/c'})
+
+    def test_index_order(self):
+        t = self.create_tree()
+        t.enable_index()
+        t.insert('a/e/x', force=True)
+        # indexed after a/e/x, but first in pre-order
+        t.insert('a/b/d/x', force=True)
+        self.assertIs(t.get('x'), t['a/b/d/x'])
+        self.assertIs(t['x'], t['a/b/d/x'])
+        t.insert('a/b/c/x', force=True)
+        self.assertEqual([n.path for n in t.get_all('x')], ['a/b/c/x', 'a/b/d/x', 'a/e/x'])
+
+    def test_ancestry(self):
+        for indexed in (False, True):
+            t = self.create_tree()
+            if indexed:
+                t.enable_interval_index()
+            b, c, e, f = t['a/b'], t['a/b/c'], t['a/e'], t['a/e/f/c']
+
+            self.assertTrue(t.is_ancestor(t, f))
+            self.assertTrue(t.is_ancestor(e, f))
+            self.assertFalse(t.is_ancestor(b, f))
+            self.assertFalse(t.is_ancestor(e, e))
+            self.assertEqual(t.subtree_size(), 8)
+            self.assertEqual(t.subtree_size(e), 4)
+            self.assertEqual([n.path for n in t.subtree(e)], ['a/e', 'a/e/c', 'a/e/f', 'a/e/f/c'])
+            self.assertIs(t.lca(c, f), t)
+            self.assertIs(t.lca(t['a/e/c'], f), e)
+            self.assertIs(t.lca(e, f), e)
+
+            b.set_parent(t['a/e/f'])
+            self.assertTrue(t.is_ancestor(e, c))
+            self.assertIs(t.lca(c, f), t['a/e/f'])
+            self.assertEqual(t.subtree_size(e), 7)
+
+
+class Test_printTree(unittest.TestCase):
+    def test_printTree(self):
+        t = Tree.create_from_paths(['a/b/c', 'a/b/d', 'a/e/f'])
+        expected = '\n'.join(['<Tree a>',
+                              '|-- <Node b>',
+                              '|   |-- <Node c>',
+                              '|   `-- <Node d>',
+                              '`-- <Node e>',
+                              '    `-- <Node f>'])
+        self.assertEqual(printTree(t), expected)
+        self.assertEqual(t.printout(), expected)
+
+        stream = StringIO()
+        self.assertIsNone(t.printout(stream=stream))
+        self.assertEqual(stream.getvalue(), expected + '\n')
+
+    def test_limits(self):
+        t = Tree.create_from_paths(['a/b/c', 'a/b/d', 'a/e/f', 'a/g'])
+        self.assertEqual(list(iterTree(t, max_depth=1, max_children=2)),
+                         ['<Tree a>', '|-- <Node b>', '|-- <Node e>', '`-- ... (1 more)'])
+        self.assertEqual(list(iterTree(t, max_depth=0)), ['<Tree a>'])
+
+    def test_deep(self):
+        t = Tree.create_from_paths(['/'.join(str(i) for i in range(5000))])
+        lines = list(iterTree(t))
+        self.assertEqual(len(lines), 5000)
+        self.assertTrue(lines[-1].endswith('`-- <Node 4999>'))
+
 
 if __name__ == '__main__':
     unittest.main()